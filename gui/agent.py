@@ -1,9 +1,15 @@
 from dotenv import load_dotenv
-from pydantic import BaseModel
-from anthropic import Anthropic
-from tools import get_tool_schemas, execute_tool
+from pydantic import BaseModel, ValidationError
+from anthropic import Anthropic, APIStatusError, APITimeoutError
+from tools import get_tool_schemas, execute_tool, ToolResultCache
+from partial_json import PartialJSONParser
+from budget import BudgetTracker, DeadlineExceeded, RunBudget
+from prefetch import Prefetcher, PrefetchStats
+from routing import ModelRoute, RouteDecision, review_fast_response
+from ratelimit import is_retryable_model_error, rate_limiter
 import json
 import os
+import time
 import base64
 from pathlib import Path
 
@@ -15,27 +21,53 @@ class ResearchResponse(BaseModel):
     sources: list[str]
     tools_used: list[str]
 
-SYSTEM_PROMPT = """You are a research assistant. Use tools to find information, then respond with ONLY valid JSON.
+class AgentRun(BaseModel):
+    """Final answer plus what the run spent and why it ended"""
+    response: ResearchResponse
+    #final_answer, end_turn, max_iterations, deadline, token_budget or cost_budget
+    stop_reason: str
+    iterations: int
+    input_tokens: int
+    output_tokens: int
+    cost_usd: float
+    elapsed_s: float
+    prefetch: PrefetchStats | None = None
+    routing: list[RouteDecision] = []
+    #sub-questions researched in parallel by fan-out mode
+    subquestions: list[str] = []
+
+FINAL_ANSWER_TOOL = "submit_research"
+
+SYSTEM_PROMPT = f"""You are a research assistant. Use tools to find information, then submit your answer with the {FINAL_ANSWER_TOOL} tool.
 
 Tools available:
 - search: Search the web for current information
 - wikipedia: Search Wikipedia for reference material
+- fetch_url: Read the main text of web pages, e.g. promising search results
 - semantic_search: Search indexed documents by meaning (if initialized)
-- save: Save findings to file
+- save: Save findings to the result store
+- {FINAL_ANSWER_TOOL}: Submit the final topic, summary, sources and tools used
+
+Never write the final answer as plain text; always call {FINAL_ANSWER_TOOL} exactly once when you are done.
 
-ALWAYS respond in this JSON format and ONLY JSON:
-{
-  "topic": "Brief topic title",
-  "summary": "Comprehensive summary of findings",
-  "sources": ["url1", "url2"],
-  "tools_used": ["search", "wikipedia", "semantic_search", "save"]
-}
+After 1-2 tool uses, synthesize findings and call {FINAL_ANSWER_TOOL} immediately."""
 
-After 1-2 tool uses, synthesize findings into the JSON response immediately."""
+FINAL_ANSWER_PROMPT = f"Submit your final answer now with the {FINAL_ANSWER_TOOL} tool."
+#closes a turn whose model call ran out of time, so the session history stays valid
+DEADLINE_NOTE = "The deadline was reached before the answer was submitted."
+
+def get_final_answer_schema() -> dict:
+    """Tool definition whose input schema is the ResearchResponse model"""
+    return {
+        "name": FINAL_ANSWER_TOOL,
+        "description": "Submit the final research answer. Call this exactly once, when research is complete.",
+        "input_schema": ResearchResponse.model_json_schema()
+    }
 
 def initialize_agent():
-    client = Anthropic()
-    tools = get_tool_schemas()
+    #retries go through the shared rate limiter instead of the SDK's per-client backoff
+    client = Anthropic(max_retries=0)
+    tools = get_tool_schemas() + [get_final_answer_schema()]
     return client, tools
 
 def load_image_as_base64(image_path: str) -> str:
@@ -58,11 +90,8 @@ def get_image_media_type(image_path: str) -> str:
     }
     return media_types.get(extension, "image/jpeg")
 
-def agent_loop(query: str, image_path: str = None, max_iterations: int = 10, progress_callback = None) -> str:
-    """Run the agent loop for a research query, optionally with an image"""
-    client, tools = initialize_agent()
-
-    # Build the initial message with optional image
+def build_user_content(query: str, image_path: str = None) -> list[dict]:
+    """User message content for a query, with the image first when one is given"""
     user_content = []
 
     #Image analysis 
@@ -87,47 +116,256 @@ def agent_loop(query: str, image_path: str = None, max_iterations: int = 10, pro
         "text": query
     })
 
-    messages = [{"role": "user", "content": user_content}]
+    return user_content
+
+def create_message(client, partial_callback=None, deadline: float = None, **kwargs):
+    """Call the Messages API, streaming the final answer when a partial callback is given.
+
+    partial_callback receives the ResearchResponse fields parsed so far each
+    time a chunk of the submit_research tool input arrives. Calls are
+    throttled and retried by the process-wide rate limiter. With a deadline
+    (a time.monotonic() value) each attempt gets the time left as its
+    timeout, and DeadlineExceeded is raised once it runs out.
+    """
+    def send(timeout):
+        request = kwargs if timeout is None else {**kwargs, "timeout": timeout}
+        if partial_callback is None:
+            raw = client.messages.with_raw_response.create(**request)
+            return raw.parse(), raw.headers
+
+        parsers = {}
+        with client.messages.stream(**request) as stream:
+            for event in stream:
+                #the timeout only bounds the wait for each chunk, not the whole stream
+                if deadline is not None and time.monotonic() > deadline:
+                    raise DeadlineExceeded()
+                if event.type == "content_block_start":
+                    block = event.content_block
+                    if block.type == "tool_use" and block.name == FINAL_ANSWER_TOOL:
+                        parsers[event.index] = PartialJSONParser()
+                elif event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                    parser = parsers.get(event.index)
+                    if parser and event.delta.partial_json:
+                        try:
+                            partial_callback(dict(parser.feed(event.delta.partial_json)))
+                        except ValueError:
+                            #malformed stream: stop previewing, the final message is still validated
+                            parsers.pop(event.index)
+            return stream.get_final_message(), stream.response.headers
+
+    def call():
+        if deadline is None:
+            return send(None)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded()
+        try:
+            return send(remaining)
+        except Exception as e:
+            #a stream that stalls mid-way raises the HTTP client's own timeout, not APITimeoutError;
+            #either way there is no time left for another attempt
+            if isinstance(e, APITimeoutError) or time.monotonic() >= deadline:
+                raise DeadlineExceeded() from e
+            raise
+    return rate_limiter.call_model(call, kwargs)
+
+#prompt caching: the tools + system prefix and the conversation so far are reused across calls
+CACHE_CONTROL = {"type": "ephemeral"}
+CACHED_SYSTEM = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
+FINAL_ANSWER_ACK = "Answer submitted."
+
+def with_cache_breakpoints(messages: list[dict], positions: set[int]) -> list[dict]:
+    """Copy of messages with a cache breakpoint on the last block of each given message.
+
+    The stored history is left untouched so breakpoints don't accumulate
+    (the API allows at most four per request).
+    """
+    marked = list(messages)
+    for position in positions:
+        if not 0 <= position < len(marked):
+            continue
+        message = marked[position]
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        if not content:
+            continue
+        last = dict(content[-1]) if isinstance(content[-1], dict) else content[-1].model_dump(exclude_none=True)
+        last["cache_control"] = CACHE_CONTROL
+        marked[position] = {**message, "content": list(content[:-1]) + [last]}
+    return marked
+
+def close_pending_tool_calls(history: list[dict]) -> list[dict]:
+    """tool_result blocks answering tool calls left open at the end of a previous turn"""
+    if not history or history[-1]["role"] != "assistant":
+        return []
+    return [
+        {"type": "tool_result", "tool_use_id": block["id"], "content": FINAL_ANSWER_ACK}
+        for block in history[-1]["content"]
+        if isinstance(block, dict) and block.get("type") == "tool_use"
+    ]
+
+def deadline_response(query: str, streamed: dict, tools_used: list[str]) -> ResearchResponse:
+    """Answer for a run cut off by its deadline, from the fields streamed so far if any"""
+    topic = streamed.get("topic")
+    summary = streamed.get("summary")
+    sources = streamed.get("sources")
+    return ResearchResponse(
+        topic=topic if isinstance(topic, str) and topic else query,
+        summary=summary if isinstance(summary, str) and summary else DEADLINE_NOTE,
+        #the last source may have been cut off mid-string
+        sources=[source for source in sources[:-1] if isinstance(source, str)] if isinstance(sources, list) else [],
+        tools_used=tools_used
+    )
+
+def agent_loop(query: str, image_path: str = None, max_iterations: int = 10, progress_callback = None,
+               partial_callback = None, budget: RunBudget = None, prefetch: bool = False,
+               route: ModelRoute = None, history: list[dict] = None,
+               tool_cache: ToolResultCache = None) -> AgentRun:
+    """Run the agent loop for a research query, optionally with an image.
+
+    When the remaining latency, token or cost budget can't cover another tool
+    round plus the final synthesis, the next turn is forced to submit the answer.
+    With prefetch, search/wikipedia/semantic lookups for the raw query start
+    alongside the first model call; unused ones are cancelled after it returns.
+    Tool-selection turns use the route's fast model and are escalated to the
+    strong model for the final synthesis, when their output is malformed, or
+    when the fast call fails with an error retrying won't fix.
+    A model call still running at the deadline is cut off and the run ends
+    with whatever part of the answer had streamed in.
+
+    history continues an earlier conversation: the new turn is appended to it
+    in place, and everything before it is sent as a cached prompt prefix.
+    """
+    client, tools = initialize_agent()
+    tracker = BudgetTracker(budget)
+    route = route or ModelRoute()
+    decisions = []
+
+    # Build the initial message with optional image
+    messages = history if history is not None else []
+    user_content = close_pending_tool_calls(messages) + build_user_content(query, image_path)
+    prior_turns = len(messages)
+
+    messages.append({"role": "user", "content": user_content})
     iteration = 0
 
-    while iteration < max_iterations:
-        iteration += 1
+    prefetcher = Prefetcher(query, tool_cache) if prefetch else None
+    if prefetcher:
+        prefetcher.start()
+
+    force_final = max_iterations <= 1
+    stop_reason = "max_iterations" if force_final else "final_answer"
+    tools_used = []
+    #latest streamed answer fields, kept for a run cut off by the deadline
+    streamed = {}
 
-        #progress updates
-        if progress_callback:
-            progress_callback(iteration, max_iterations, f"Processing iteration {iteration}")
+    def preview(fields: dict):
+        streamed.clear()
+        streamed.update(fields)
+        partial_callback(fields)
 
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4096,
-            system=SYSTEM_PROMPT,
-            tools=tools,
-            messages=messages
+    def finish(response: ResearchResponse, reason: str) -> AgentRun:
+        return AgentRun(
+            response=response,
+            stop_reason=reason,
+            iterations=iteration,
+            input_tokens=tracker.input_tokens,
+            output_tokens=tracker.output_tokens,
+            cost_usd=tracker.cost_usd,
+            elapsed_s=tracker.elapsed_s,
+            prefetch=prefetcher.finish() if prefetcher else None,
+            routing=decisions
         )
 
-        #add response to message history
-        messages.append({
-            "role": "assistant",
-            "content": response.content
-        })
+    try:
+        while iteration < max_iterations:
+            iteration += 1
+            tracker.start_round()
+            tokens_before, cost_before = tracker.tokens, tracker.cost_usd
+
+            #progress updates
+            if progress_callback:
+                progress_callback(iteration, max_iterations, f"Processing iteration {iteration}")
+
+            reason = "synthesis" if force_final else "tool_selection"
+            while True:
+                #without a cascade every turn goes to the strong model, but keeps its reason
+                strong = reason != "tool_selection" or not route.cascading
+                model = route.strong_model if strong else route.fast_model
+                try:
+                    response = create_message(
+                        client,
+                        #fast-model answers are discarded, so only strong turns are previewed
+                        preview if strong and partial_callback else None,
+                        deadline=tracker.deadline_at,
+                        model=model,
+                        max_tokens=route.strong_max_tokens if strong else route.fast_max_tokens,
+                        system=CACHED_SYSTEM,
+                        tools=tools,
+                        tool_choice={"type": "tool", "name": FINAL_ANSWER_TOOL} if force_final else {"type": "auto"},
+                        #cache the earlier turns and, for the next iteration, everything up to now
+                        messages=with_cache_breakpoints(messages, {prior_turns - 1, len(messages) - 1})
+                    )
+                except DeadlineExceeded:
+                    messages.append({"role": "assistant", "content": [{"type": "text", "text": DEADLINE_NOTE}]})
+                    return finish(deadline_response(query, streamed, tools_used), "deadline")
+                except APIStatusError as e:
+                    #a fast call that can't succeed (e.g. a retired model) is redone like malformed output;
+                    #retryable errors were already retried by the rate limiter
+                    if strong or is_retryable_model_error(e):
+                        raise
+                    decisions.append(RouteDecision(iteration=iteration, model=model, reason=reason))
+                    reason = "escalated_error"
+                    continue
+                tracker.record_usage(model, response.usage)
+                decisions.append(RouteDecision(iteration=iteration, model=model, reason=reason))
 
-        # Check if we're done (stop_reason == "end_turn")
-        if response.stop_reason == "end_turn":
-            #extract the final text response
+                problem = None if strong else review_fast_response(response, tools, FINAL_ANSWER_TOOL)
+                if problem is None:
+                    break
+                #redo this turn with the strong model; the fast response is dropped
+                reason = f"escalated_{problem}"
+                force_final = force_final or problem == "synthesis"
+
+            #add response to message history
+            messages.append({
+                "role": "assistant",
+                "content": [block.model_dump(exclude_none=True) for block in response.content]
+            })
+
+            #the first response shows which speculative lookups the model wants
+            if prefetcher and iteration == 1:
+                for block in response.content:
+                    if block.type == "tool_use":
+                        prefetcher.record_call(block.name, block.input)
+                prefetcher.cancel_unused()
+
+            #execute any tools necessary; the final answer tool ends the run
+            tool_results = []
             for block in response.content:
-                if hasattr(block, "text"):
-                    return block.text
-            return ""
+                if block.type != "tool_use":
+                    continue
 
-        #execute any tools necessary
-        tool_results = []
-        for block in response.content:
-            if block.type == "tool_use":
-                tool_name = block.name
-                tool_input = block.input
+                if block.name == FINAL_ANSWER_TOOL:
+                    try:
+                        final = ResearchResponse(**block.input)
+                    except ValidationError as e:
+                        result = f"Invalid final answer, fix these fields and call {FINAL_ANSWER_TOOL} again: {e}"
+                        tool_results.append({
+                            "type": "tool_result",
+                            "tool_use_id": block.id,
+                            "content": result,
+                            "is_error": True
+                        })
+                        continue
+
+                    return finish(final, stop_reason)
 
                 #execute the tool
-                result = execute_tool(tool_name, tool_input)
+                result = execute_tool(block.name, block.input, tool_cache)
+                if block.name not in tools_used:
+                    tools_used.append(block.name)
 
                 tool_results.append({
                     "type": "tool_result",
@@ -135,14 +373,32 @@ def agent_loop(query: str, image_path: str = None, max_iterations: int = 10, pro
                     "content": result
                 })
 
-        #Add tool to messages if any were executed
-        if tool_results:
+            tracker.end_round(tokens_before, cost_before)
+
+            #ask for the structured answer directly if the model stopped without submitting,
+            #the remaining budget only covers the synthesis, or the next iteration is the last one
+            if not force_final:
+                if not tool_results:
+                    stop_reason = "end_turn"
+                else:
+                    stop_reason = tracker.exhausted_by() or stop_reason
+                    if stop_reason == "final_answer" and iteration + 1 == max_iterations:
+                        stop_reason = "max_iterations"
+                force_final = stop_reason != "final_answer"
+
+            if force_final:
+                tool_results.append({"type": "text", "text": FINAL_ANSWER_PROMPT})
+
             messages.append({
                 "role": "user",
                 "content": tool_results
             })
 
-    return "Max iterations reached without completion"
+        raise RuntimeError(f"No final answer after {max_iterations} iterations")
+    finally:
+        #cancel speculative lookups if the run failed before finishing them
+        if prefetcher:
+            prefetcher.cancel_unused()
 
 """
 if __name__ == "__main__":
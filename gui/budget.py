@@ -0,0 +1,128 @@
+import time
+from pydantic import BaseModel
+
+#USD per million tokens: (input, output)
+PRICING = {
+    "claude-sonnet-4-6": (3.00, 15.00),
+    "claude-haiku-4-5": (1.00, 5.00),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-opus-4-20250514": (15.00, 75.00),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+}
+DEFAULT_PRICING = PRICING["claude-sonnet-4-6"]
+
+#prompt cache writes and reads are billed relative to the base input price
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.10
+
+#the next round is estimated from the last one, padded for history growth
+ROUND_SAFETY_FACTOR = 1.2
+
+
+class DeadlineExceeded(Exception):
+    """A model call was cut off by the run's deadline"""
+
+
+class RunBudget(BaseModel):
+    """Limits for a single agent run; None means unlimited"""
+    deadline_s: float | None = None
+    max_tokens: int | None = None
+    max_cost_usd: float | None = None
+
+
+def usage_cost(model: str, usage) -> float:
+    """Cost in USD of a Messages API usage block"""
+    input_price, output_price = PRICING.get(model, DEFAULT_PRICING)
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    return (
+        usage.input_tokens * input_price
+        + cache_write * input_price * CACHE_WRITE_MULTIPLIER
+        + cache_read * input_price * CACHE_READ_MULTIPLIER
+        + usage.output_tokens * output_price
+    ) / 1_000_000
+
+
+class BudgetTracker:
+    """Tracks wall-clock time, tokens and cost spent by an agent run.
+
+    Each tool round (model call plus tool execution) is recorded; the last
+    round is used as the estimate for the next one, and for the final
+    synthesis turn.
+    """
+
+    def __init__(self, budget: RunBudget | None = None):
+        self.budget = budget or RunBudget()
+        self.started = time.monotonic()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self._round_started = self.started
+        self._last_round = (0.0, 0, 0.0)
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def deadline_at(self) -> float | None:
+        """time.monotonic() value at which the deadline runs out"""
+        if self.budget.deadline_s is None:
+            return None
+        return self.started + self.budget.deadline_s
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def start_round(self):
+        self._round_started = time.monotonic()
+
+    def record_usage(self, model: str, usage):
+        """Add the usage of one model call; cached prompt tokens count as input"""
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        self.input_tokens += usage.input_tokens + cache_write + cache_read
+        self.output_tokens += usage.output_tokens
+        self.cost_usd += usage_cost(model, usage)
+
+    def end_round(self, tokens_before: int, cost_before: float):
+        """Remember what the round that just finished cost"""
+        self._last_round = (
+            time.monotonic() - self._round_started,
+            self.tokens - tokens_before,
+            self.cost_usd - cost_before,
+        )
+
+    def add_spend(self, input_tokens: int, output_tokens: int, cost_usd: float):
+        """Add spend recorded elsewhere, e.g. by a sub-agent run"""
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cost_usd += cost_usd
+
+    def share(self, parts: int, reserve: float = 0.2) -> RunBudget:
+        """Budget for each of `parts` concurrent sub-runs, keeping `reserve` of what remains"""
+        budget = self.budget
+        deadline = tokens = cost = None
+        if budget.deadline_s is not None:
+            #concurrent branches share wall-clock time rather than splitting it
+            deadline = max(budget.deadline_s - self.elapsed_s, 0) * (1 - reserve)
+        if budget.max_tokens is not None:
+            tokens = int(max(budget.max_tokens - self.tokens, 0) * (1 - reserve) / parts)
+        if budget.max_cost_usd is not None:
+            cost = max(budget.max_cost_usd - self.cost_usd, 0) * (1 - reserve) / parts
+        return RunBudget(deadline_s=deadline, max_tokens=tokens, max_cost_usd=cost)
+
+    def exhausted_by(self) -> str | None:
+        """Name of the budget that can't cover another tool round plus the final synthesis"""
+        seconds, tokens, cost = (value * ROUND_SAFETY_FACTOR for value in self._last_round)
+        budget = self.budget
+
+        if budget.deadline_s is not None and self.elapsed_s + 2 * seconds > budget.deadline_s:
+            return "deadline"
+        if budget.max_tokens is not None and self.tokens + 2 * tokens > budget.max_tokens:
+            return "token_budget"
+        if budget.max_cost_usd is not None and self.cost_usd + 2 * cost > budget.max_cost_usd:
+            return "cost_budget"
+        return None
@@ -0,0 +1,213 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from anthropic import APIStatusError
+
+from agent import (
+    AgentRun, FINAL_ANSWER_TOOL, ResearchResponse, agent_loop, build_user_content, create_message,
+    get_final_answer_schema, initialize_agent
+)
+from budget import BudgetTracker, DeadlineExceeded, RunBudget
+from ratelimit import is_retryable_model_error
+from routing import ModelRoute, RouteDecision
+
+PLAN_TOOL = "plan_subquestions"
+
+PLANNER_PROMPT = """You plan research. Split the user's question into independent sub-questions that can be researched in parallel without depending on each other's answers.
+Each sub-question must be self-contained (repeat any names or context it needs, including anything visible in an attached image).
+Use as few sub-questions as cover the question; a narrow question needs only one."""
+
+#branch stop reasons that mean the run was cut short by its budget
+BUDGET_STOP_REASONS = ("deadline", "token_budget", "cost_budget")
+
+MERGE_PROMPT = f"""You are a research assistant. Merge the findings of several parallel research branches into one answer to the original question.
+Resolve overlaps and contradictions, keep concrete facts and cite the sources the branches used.
+Submit the merged answer with the {FINAL_ANSWER_TOOL} tool."""
+
+
+def get_plan_schema(max_subquestions: int) -> dict:
+    return {
+        "name": PLAN_TOOL,
+        "description": "Submit the independent sub-questions to research in parallel.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "subquestions": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": f"Between 1 and {max_subquestions} self-contained sub-questions"
+                }
+            },
+            "required": ["subquestions"]
+        }
+    }
+
+
+def _dedupe(items) -> list[str]:
+    """Order-preserving de-duplication that ignores case and surrounding whitespace"""
+    seen = set()
+    unique = []
+    for item in items:
+        key = item.strip().casefold()
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(item.strip())
+    return unique
+
+
+def plan_subquestions(client, query: str, image_path: str, route: ModelRoute, tracker: BudgetTracker,
+                      max_subquestions: int) -> list[str]:
+    """Ask the fast model to split the query; falls back to the query itself"""
+    try:
+        response = create_message(
+            client,
+            deadline=tracker.deadline_at,
+            model=route.fast_model,
+            max_tokens=route.fast_max_tokens,
+            system=PLANNER_PROMPT,
+            tools=[get_plan_schema(max_subquestions)],
+            tool_choice={"type": "tool", "name": PLAN_TOOL},
+            messages=[{"role": "user", "content": build_user_content(query, image_path)}]
+        )
+    except DeadlineExceeded:
+        return [query]
+    except APIStatusError as e:
+        #e.g. a retired fast model; planning is optional, so research the query whole
+        if is_retryable_model_error(e):
+            raise
+        return [query]
+    tracker.record_usage(route.fast_model, response.usage)
+
+    for block in response.content:
+        if block.type == "tool_use" and block.name == PLAN_TOOL:
+            subquestions = block.input.get("subquestions")
+            if isinstance(subquestions, list):
+                planned = _dedupe(q for q in subquestions if isinstance(q, str))[:max_subquestions]
+                if planned:
+                    return planned
+    return [query]
+
+
+def merge_findings(client, query: str, branches: list[tuple[str, AgentRun]], route: ModelRoute,
+                   tracker: BudgetTracker, partial_callback=None) -> ResearchResponse:
+    """Have the strong model merge branch answers into one ResearchResponse"""
+    findings = []
+    for number, (subquestion, run) in enumerate(branches, start=1):
+        answer = run.response
+        sources = ", ".join(answer.sources) if answer.sources else "None"
+        findings.append(f"### Branch {number}: {subquestion}\n{answer.summary}\nSources: {sources}")
+    prompt = f"Original question: {query}\n\nFindings:\n\n" + "\n\n".join(findings)
+
+    try:
+        response = create_message(
+            client,
+            partial_callback,
+            deadline=tracker.deadline_at,
+            model=route.strong_model,
+            max_tokens=route.strong_max_tokens,
+            system=MERGE_PROMPT,
+            tools=[get_final_answer_schema()],
+            tool_choice={"type": "tool", "name": FINAL_ANSWER_TOOL},
+            messages=[{"role": "user", "content": prompt}]
+        )
+    except DeadlineExceeded:
+        #out of time: the branch answers are joined as they are
+        merged = {}
+    else:
+        tracker.record_usage(route.strong_model, response.usage)
+        merged = next(
+            (block.input for block in response.content if block.type == "tool_use" and block.name == FINAL_ANSWER_TOOL),
+            {}
+        )
+    return ResearchResponse(
+        topic=merged.get("topic") or query,
+        summary=merged.get("summary") or "\n\n".join(run.response.summary for _, run in branches),
+        #branch sources and tools are authoritative; the merge may only add to them
+        sources=_dedupe([s for _, run in branches for s in run.response.sources] + list(merged.get("sources") or [])),
+        tools_used=_dedupe([t for _, run in branches for t in run.response.tools_used] + list(merged.get("tools_used") or []))
+    )
+
+
+def fan_out_research(query: str, image_path: str = None, max_subquestions: int = 4, max_concurrency: int = 3,
+                     branch_iterations: int = 3, progress_callback=None, partial_callback=None,
+                     budget: RunBudget = None, route: ModelRoute = None) -> AgentRun:
+    """Research a broad query as parallel sub-questions and merge the results.
+
+    The fast model plans independent sub-questions, each runs as a short
+    agent_loop on its own thread (at most max_concurrency at once, all
+    sharing the process-wide tool result cache), and the strong model merges
+    the branch answers. Wall-clock time is roughly planning plus the slowest
+    branch plus the merge, instead of the sum of every iteration.
+    """
+    client, _ = initialize_agent()
+    tracker = BudgetTracker(budget)
+    route = route or ModelRoute()
+    decisions = [RouteDecision(iteration=0, model=route.fast_model, reason="plan")]
+
+    if progress_callback:
+        progress_callback(0, 1, "Planning sub-questions")
+    subquestions = plan_subquestions(client, query, image_path, route, tracker, max_subquestions)
+    total_steps = len(subquestions) + 2
+    if progress_callback:
+        progress_callback(1, total_steps, f"Researching {len(subquestions)} sub-questions in parallel")
+
+    branch_budget = tracker.share(len(subquestions))
+    submitted = time.monotonic()
+
+    def run_branch(subquestion):
+        #branches queued behind max_concurrency only get what is left of the shared
+        #deadline, so every branch finishes by the same absolute time
+        budget = branch_budget
+        if budget.deadline_s is not None:
+            remaining = budget.deadline_s - (time.monotonic() - submitted)
+            if remaining <= 0:
+                return None
+            budget = budget.model_copy(update={"deadline_s": remaining})
+        return agent_loop(subquestion, max_iterations=branch_iterations, budget=budget, route=route)
+
+    branches = {}
+    errors = []
+    budget_stops = []
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="branch") as pool:
+        futures = {pool.submit(run_branch, subquestion): subquestion for subquestion in subquestions}
+        for future in as_completed(futures):
+            subquestion = futures[future]
+            try:
+                run = future.result()
+            except Exception as e:
+                errors.append(f"{subquestion}: {e}")
+                continue
+            if run is None:
+                budget_stops.append("deadline")
+                errors.append(f"{subquestion}: deadline reached before it could start")
+                continue
+            branches[subquestion] = run
+            if run.stop_reason in BUDGET_STOP_REASONS:
+                budget_stops.append(run.stop_reason)
+            tracker.add_spend(run.input_tokens, run.output_tokens, run.cost_usd)
+            decisions.extend(run.routing)
+            if progress_callback:
+                progress_callback(len(branches) + len(errors) + 1, total_steps, f"Finished: {subquestion}")
+
+    if not branches:
+        raise RuntimeError(f"Every research branch failed: {'; '.join(errors)}")
+
+    if progress_callback:
+        progress_callback(total_steps, total_steps, "Merging findings")
+    #keep the planned order so the merge prompt reads like the plan
+    ordered = [(subquestion, branches[subquestion]) for subquestion in subquestions if subquestion in branches]
+    response = merge_findings(client, query, ordered, route, tracker, partial_callback)
+    decisions.append(RouteDecision(iteration=0, model=route.strong_model, reason="merge"))
+
+    return AgentRun(
+        response=response,
+        #a branch cut short by the budget means the merged answer was too
+        stop_reason=budget_stops[0] if budget_stops else "final_answer",
+        iterations=max(run.iterations for _, run in ordered),
+        input_tokens=tracker.input_tokens,
+        output_tokens=tracker.output_tokens,
+        cost_usd=tracker.cost_usd,
+        elapsed_s=tracker.elapsed_s,
+        routing=decisions,
+        subquestions=subquestions
+    )
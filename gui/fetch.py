@@ -0,0 +1,290 @@
+import codecs
+import hashlib
+import ipaddress
+import json
+import os
+import re
+import socket
+import tempfile
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urlparse
+
+import httpx
+
+from ratelimit import rate_limiter
+
+#elements whose text is never main content
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe"}
+#elements that usually wrap the main content of a page
+MAIN_TAGS = {"article", "main"}
+BLOCK_TAGS = {"p", "div", "section", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dd", "dt"}
+VOID_TAGS = {"br", "img", "hr", "input", "meta", "link", "source", "wbr", "area", "base", "col", "embed", "param", "track"}
+TEXT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "application/json", "text/markdown")
+
+#main-content text shorter than this is ignored in favour of the whole body
+MIN_MAIN_CHARS = 200
+MAX_REDIRECTS = 5
+
+
+class MainContentExtractor(HTMLParser):
+    """Incremental HTML-to-text extractor that prefers <article>/<main> content"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self._stack = []
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._in_title = False
+        self._body = []
+        self._main = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br":
+                self._add("\n")
+            return
+        self._stack.append(tag)
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in MAIN_TAGS:
+            self._main_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        if tag in BLOCK_TAGS:
+            self._add("\n")
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            return
+        #close anything left open inside this element
+        while self._stack:
+            open_tag = self._stack.pop()
+            if open_tag in SKIPPED_TAGS:
+                self._skip_depth -= 1
+            elif open_tag in MAIN_TAGS:
+                self._main_depth -= 1
+            elif open_tag == "title":
+                self._in_title = False
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self._add("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self._add(data)
+
+    def _add(self, text: str):
+        self._body.append(text)
+        if self._main_depth:
+            self._main.append(text)
+
+    def text(self) -> str:
+        main = _collapse("".join(self._main))
+        return main if len(main) >= MIN_MAIN_CHARS else _collapse("".join(self._body))
+
+
+def _check_address(url: str, host: str, address: str):
+    """Raise ValueError unless address is a public unicast address"""
+    address = ipaddress.ip_address(address.split("%")[0])
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    if not address.is_global or address.is_multicast:
+        raise ValueError(f"Refusing to fetch {url}: {host} resolves to non-public address {address}")
+
+
+def _collapse(text: str) -> str:
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class PageFetcher:
+    """Fetches pages and extracts their main text through one pooled httpx client.
+
+    Extracted text is cached on disk with the page's ETag/Last-Modified so
+    later fetches revalidate with a conditional GET; responses are streamed,
+    decoded incrementally and cut off at max_bytes.
+
+    URLs come from the model, so hosts that resolve to loopback, private,
+    link-local or other non-public addresses are refused, on the first
+    request and on every redirect hop, unless allow_private is set. The
+    address actually connected to is checked as well, so a host whose DNS
+    answer changes between the check and the request is still refused.
+    """
+
+    def __init__(self, cache_dir: str = "./fetch_cache", max_bytes: int = 2 * 1024 * 1024,
+                 timeout: float = 15.0, fresh_s: float = 3600, max_workers: int = 4,
+                 allow_private: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fresh_s = fresh_s
+        self.max_workers = max_workers
+        self.allow_private = allow_private
+        #redirects are followed by _open so each hop's host is checked
+        self.client = httpx.Client(
+            follow_redirects=False,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            headers={"User-Agent": "Agentflow/1.0 (research assistant)"}
+        )
+
+    def _cache_path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def _load(self, url: str) -> dict | None:
+        try:
+            with open(self._cache_path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, url: str, entry: dict):
+        path = self._cache_path(url)
+        #unique per write: concurrent fetches of one URL must not share a temp file
+        fd, temp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def _check_url(self, url: str):
+        """Raise ValueError for non-http(s) URLs and hosts that resolve to non-public addresses"""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Only http(s) URLs can be fetched: {url}")
+        if not parsed.hostname:
+            raise ValueError(f"URL has no host: {url}")
+        if self.allow_private:
+            return
+
+        try:
+            port = parsed.port or (443 if parsed.scheme == "https" else 80)
+            infos = socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+        except (socket.gaierror, ValueError) as e:
+            raise ValueError(f"Could not resolve {parsed.hostname}: {e}")
+        for info in infos:
+            _check_address(url, parsed.hostname, info[4][0])
+
+    def _check_peer(self, url: str, response: httpx.Response):
+        """Raise ValueError if the connection a response arrived on is to a non-public address.
+
+        The host is resolved again when connecting, so a DNS answer that
+        changes after _check_url (rebinding) is caught here, before the body
+        is read.
+        """
+        if self.allow_private:
+            return
+        stream = response.extensions.get("network_stream")
+        peer = stream.get_extra_info("server_addr") if stream is not None else None
+        if not peer:
+            raise ValueError(f"Refusing to fetch {url}: could not verify the server address")
+        _check_address(url, urlparse(url).hostname, peer[0])
+
+    def _open(self, url: str, headers: dict) -> httpx.Response:
+        """Send a streaming GET, following redirects only to URLs that pass _check_url"""
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_url(url)
+            response = self.client.send(self.client.build_request("GET", url, headers=headers), stream=True)
+            try:
+                self._check_peer(url, response)
+            except ValueError:
+                response.close()
+                raise
+            #next_request is only set for redirects httpx can follow (not 304)
+            if response.next_request is None:
+                return response
+            response.close()
+            url = str(response.next_request.url)
+        raise ValueError(f"Too many redirects fetching {url}")
+
+    def fetch(self, url: str) -> str:
+        """Return the main text of a page, revalidating the cached copy if there is one"""
+        if urlparse(url).scheme not in ("http", "https"):
+            raise ValueError(f"Only http(s) URLs can be fetched: {url}")
+
+        cached = self._load(url)
+        if cached and time.time() - cached["fetched_at"] < self.fresh_s:
+            return cached["text"]
+
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        with closing(self._open(url, headers)) as response:
+            if response.status_code == 304 and cached:
+                cached["fetched_at"] = time.time()
+                self._save(url, cached)
+                return cached["text"]
+            response.raise_for_status()
+
+            content_type = response.headers.get("content-type", "text/html").split(";")[0].strip().lower()
+            if not content_type.startswith(TEXT_TYPES):
+                raise ValueError(f"Unsupported content type {content_type}")
+            text = self._read_text(response, content_type)
+
+        self._save(url, {
+            "url": url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched_at": time.time(),
+            "text": text
+        })
+        return text
+
+    def _read_text(self, response: httpx.Response, content_type: str) -> str:
+        """Stream the body through an incremental decoder, stopping at max_bytes"""
+        try:
+            decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        extractor = MainContentExtractor() if "html" in content_type else None
+        parts = []
+        received = 0
+
+        for chunk in response.iter_bytes():
+            chunk = chunk[:self.max_bytes - received]
+            received += len(chunk)
+            text = decoder.decode(chunk)
+            if extractor:
+                extractor.feed(text)
+            else:
+                parts.append(text)
+            if received >= self.max_bytes:
+                break
+
+        #a body cut off at max_bytes may end mid-character; drop it rather than emit U+FFFD
+        tail = decoder.decode(b"", final=True) if received < self.max_bytes else ""
+        if extractor:
+            extractor.feed(tail)
+            extractor.close()
+            title = _collapse(extractor.title)
+            body = extractor.text()
+            return f"{title}\n\n{body}" if title else body
+        return _collapse("".join(parts) + tail)
+
+    def fetch_many(self, urls: list[str], max_chars: int = 3000) -> str:
+        """Fetch several URLs concurrently and format their text for the model"""
+        def fetch_one(url):
+            try:
+                text = rate_limiter.call_tool("fetch_url", lambda: self.fetch(url))
+            except Exception as e:
+                return f"Source: {url}\nError fetching page: {e}"
+            if len(text) > max_chars:
+                text = text[:max_chars] + "\n[...truncated...]"
+            return f"Source: {url}\n{text}"
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as pool:
+            return "\n\n".join(pool.map(fetch_one, urls))
@@ -1,11 +1,15 @@
+import threading
 from customtkinter import *
 from gui_worker import AgentWorker
 from PIL import ImageGrab
 import pyperclip
-import json
 from datetime import datetime
 from tkinter import filedialog
 from agent import ResearchResponse
+from budget import RunBudget
+from store import get_store
+from session import ResearchSession
+from results_view import ResultsView, StorePager, VirtualList
 
 class AgentGUI:
     """Modern AI Research Assistant GUI with sleek dark theme and glass-morphism effects"""
@@ -26,6 +30,12 @@ class AgentGUI:
         'hover': '#3a3a3a'
     }
 
+    #interactive runs are synthesized before this latency SLO is exceeded
+    RESEARCH_DEADLINE_S = 60
+
+    #most matches listed when searching the history
+    HISTORY_SEARCH_LIMIT = 500
+
     FONTS = {
         'heading': ("Segoe UI", 20, "bold"),
         'subheading': ("Segoe UI", 14, "bold"),
@@ -41,6 +51,13 @@ class AgentGUI:
         self.app.title("Agetnflow")
         self.worker_thread = None
         self.selected_image_path = None
+        #result shown in the results view and its ResultStore record id, if saved
+        self.current_result = None
+        self.current_record_id = None
+        #(message, status type) of a finished background export
+        self.export_status = None
+        #follow-up questions continue the last session, even across restarts
+        self.session = ResearchSession.latest() or ResearchSession()
 
         # Set dark theme
         set_appearance_mode("dark")
@@ -59,6 +76,10 @@ class AgentGUI:
 
         self.setup_ui()
 
+        self.reload_history()
+        if self.session.responses:
+            self.display_results(self.session.responses[-1])
+
     def setup_ui(self):
         """Build the modern UI layout"""
 
@@ -147,7 +168,32 @@ class AgentGUI:
             height=36,
             command=self.on_read_screen_clicked
         )
-        self.screenshot_btn.pack(anchor="w")
+        self.screenshot_btn.pack(side="left")
+
+        # New session button: the next query starts without prior context
+        self.new_session_btn = CTkButton(
+            master=input_container,
+            text="🆕  New Session",
+            font=self.FONTS['button'],
+            fg_color=self.COLORS['bg_secondary'],
+            hover_color=self.COLORS['hover'],
+            text_color=self.COLORS['text_secondary'],
+            border_color=self.COLORS['border'],
+            border_width=1,
+            corner_radius=20,
+            height=36,
+            command=self.on_new_session_clicked
+        )
+        self.new_session_btn.pack(side="left", padx=(8, 0))
+
+        self.session_label = CTkLabel(
+            master=input_container,
+            text="",
+            font=self.FONTS['caption'],
+            text_color=self.COLORS['text_tertiary']
+        )
+        self.session_label.pack(side="left", padx=(12, 0))
+        self.update_session_label()
 
     def create_action_buttons(self, parent):
         """Create primary action buttons"""
@@ -187,6 +233,16 @@ class AgentGUI:
         )
         self.stop_btn.pack(side="left", padx=6, fill="x", expand=True)
 
+        # Fan-out toggle: split broad questions into parallel sub-questions
+        self.fan_out_switch = CTkSwitch(
+            master=action_container,
+            text="Deep research (parallel sub-questions)",
+            font=self.FONTS['caption'],
+            text_color=self.COLORS['text_secondary'],
+            progress_color=self.COLORS['accent_secondary']
+        )
+        self.fan_out_switch.pack(pady=(10, 0))
+
     def create_progress_section(self, parent):
         """Create modern progress bar with gradient effect"""
         progress_container = CTkFrame(master=parent, fg_color="transparent")
@@ -214,7 +270,7 @@ class AgentGUI:
         self.progress_label.pack()
 
     def create_results_section(self, parent):
-        """Create glass-morphism results card"""
+        """Create glass-morphism results card with result and history tabs"""
         # Results card with glass effect
         self.results_card = CTkFrame(
             master=parent,
@@ -225,14 +281,25 @@ class AgentGUI:
         )
         self.results_card.pack(fill="both", expand=True, pady=15)
 
+        self.results_tabs = CTkTabview(
+            master=self.results_card,
+            fg_color="transparent",
+            segmented_button_selected_color=self.COLORS['accent_primary'],
+            segmented_button_unselected_color=self.COLORS['bg_secondary'],
+            text_color=self.COLORS['text_primary']
+        )
+        self.results_tabs.pack(fill="both", expand=True, padx=2, pady=2)
+        result_tab = self.results_tabs.add("Result")
+        history_tab = self.results_tabs.add("History")
+
         # Scrollable frame for results
         self.results_scroll = CTkScrollableFrame(
-            master=self.results_card,
+            master=result_tab,
             fg_color="transparent",
             scrollbar_button_color=self.COLORS['bg_secondary'],
             scrollbar_button_hover_color=self.COLORS['hover']
         )
-        self.results_scroll.pack(fill="both", expand=True, padx=2, pady=2)
+        self.results_scroll.pack(fill="both", expand=True)
 
         # Placeholder
         self.results_placeholder = CTkLabel(
@@ -244,6 +311,44 @@ class AgentGUI:
         )
         self.results_placeholder.pack(expand=True, pady=60)
 
+        #built once and patched in place; shown instead of the placeholder on the first result
+        self.results_view = ResultsView(self.results_scroll, self.COLORS, self.FONTS)
+
+        self.create_history_section(history_tab)
+
+    def create_history_section(self, parent):
+        """Create the searchable list of stored results"""
+        self.history_search = CTkEntry(
+            master=parent,
+            placeholder_text="Search past results and press Enter",
+            font=self.FONTS['body'],
+            fg_color=self.COLORS['bg_secondary'],
+            border_color=self.COLORS['border'],
+            text_color=self.COLORS['text_primary'],
+            height=34
+        )
+        self.history_search.pack(fill="x", padx=10, pady=(0, 8))
+        self.history_search.bind("<Return>", lambda event: self.reload_history())
+
+        self.history_pager = StorePager(get_store())
+        self.history_list = VirtualList(
+            parent,
+            make_row=lambda master: CTkButton(
+                master=master,
+                text="",
+                font=self.FONTS['body'],
+                fg_color="transparent",
+                hover_color=self.COLORS['hover'],
+                text_color=self.COLORS['text_secondary'],
+                anchor="w",
+                corner_radius=6
+            ),
+            render_row=self.render_history_row,
+            row_height=32,
+            bg=self.COLORS['bg_card']
+        )
+        self.history_list.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
     def create_bottom_actions(self, parent):
         """Create bottom action buttons for export/copy"""
         bottom_container = CTkFrame(master=parent, fg_color="transparent")
@@ -308,16 +413,26 @@ class AgentGUI:
         self.copy_btn.configure(state="disabled")
         self.export_btn.configure(state="disabled")
         self.screenshot_btn.configure(state="disabled")
+        self.new_session_btn.configure(state="disabled")
+        self.fan_out_switch.configure(state="disabled")
 
         # Reset progress
         self.progress_bar.set(0)
         self.update_status("Researching...", "active")
 
+        self.results_tabs.set("Result")
+        self.current_result = None
+        self.current_record_id = None
+        self.results_view.clear()
+
         self.worker_thread = AgentWorker(
             query=query_text,
             image_path=self.selected_image_path,
             max_iter=10,
-            callback=self.update_progress
+            callback=self.update_progress,
+            budget=RunBudget(deadline_s=self.RESEARCH_DEADLINE_S),
+            fan_out=bool(self.fan_out_switch.get()),
+            session=self.session
         )
 
         self.worker_thread.start()
@@ -340,6 +455,8 @@ class AgentGUI:
     def check_progress(self):
         """Monitor worker thread completion"""
         if self.worker_thread and self.worker_thread.is_alive():
+            if self.worker_thread.partial:
+                self.display_partial(self.worker_thread.partial)
             self.app.after(100, self.check_progress)
         else:
             # Re-enable buttons
@@ -347,13 +464,41 @@ class AgentGUI:
             self.copy_btn.configure(state="normal")
             self.export_btn.configure(state="normal")
             self.screenshot_btn.configure(state="normal")
+            self.new_session_btn.configure(state="normal")
+            self.fan_out_switch.configure(state="normal")
+            self.update_session_label()
 
             if self.worker_thread and self.worker_thread.result:
-                self.display_results(self.worker_thread.result)
-                self.update_status("Research complete", "success")
+                #a screenshot that went into the session history isn't attached again;
+                #fan-out runs don't write to the session, so theirs stays selected
+                if not self.worker_thread.fan_out and self.worker_thread.image_path == self.selected_image_path:
+                    self.selected_image_path = None
+                self.display_results(self.worker_thread.result, self.worker_thread.record_id)
+                self.reload_history()
+                report = self.worker_thread.report
+                if report.stop_reason in ("deadline", "token_budget", "cost_budget"):
+                    reason = report.stop_reason.replace("_", " ")
+                    self.update_status(f"Research complete ({reason} reached after {report.elapsed_s:.0f}s)", "success")
+                else:
+                    self.update_status("Research complete", "success")
             else:
                 self.update_status("Ready", "success")
 
+    def on_new_session_clicked(self):
+        """Start a fresh session; the previous one stays saved on disk"""
+        self.session = ResearchSession()
+        self.update_session_label()
+        self.update_status("New session started", "success")
+        self.app.after(3000, lambda: self.update_status("Ready", "success"))
+
+    def update_session_label(self):
+        """Show how many turns the current session has"""
+        turns = len(self.session.responses)
+        if turns:
+            self.session_label.configure(text=f"Session: {self.session.title} ({turns} turns)")
+        else:
+            self.session_label.configure(text="New session")
+
     def on_stop_clicked(self):
         """Stop research execution"""
         if self.worker_thread:
@@ -362,120 +507,107 @@ class AgentGUI:
 
     def on_export_clicked(self):
         """Export results to JSON file"""
-        if not self.worker_thread or not self.worker_thread.result:
+        if not self.current_result:
             self.update_status("No results to export", "error")
             self.app.after(3000, lambda: self.update_status("Ready", "success"))
             return
 
-        result_dict = self.worker_thread.result.model_dump()
-        result_dict['exported_at'] = datetime.now().isoformat()
         filename = f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        result, record_id = self.current_result, self.current_record_id
+
+        #store writes and reads wait on the writer thread, so keep them off the UI thread
+        def export():
+            try:
+                store = get_store()
+                exported_id = record_id
+                if exported_id is None:
+                    exported_id = store.put(result, kind="export")
+                    store.flush()
+                store.export_json(filename, [exported_id])
+                self.export_status = (f"Exported: {filename}", "success")
+            except Exception as e:
+                self.export_status = (f"Export failed: {e}", "error")
 
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(result_dict, f, indent=2, ensure_ascii=False)
-            self.update_status(f"Exported: {filename}", "success")
-            self.app.after(5000, lambda: self.update_status("Ready", "success"))
-        except Exception as e:
-            self.update_status(f"Export failed: {e}", "error")
-            self.app.after(5000, lambda: self.update_status("Ready", "success"))
+        self.export_btn.configure(state="disabled")
+        self.export_status = None
+        threading.Thread(target=export, daemon=True).start()
+        self.check_export()
+
+    def check_export(self):
+        """Report the background export once it finishes"""
+        if self.export_status is None:
+            self.app.after(100, self.check_export)
+            return
+        message, status_type = self.export_status
+        self.export_btn.configure(state="normal")
+        self.update_status(message, status_type)
+        self.app.after(5000, lambda: self.update_status("Ready", "success"))
 
     def on_copy_results(self):
         """Copy results to clipboard"""
-        if not self.worker_thread or not self.worker_thread.result:
+        if not self.current_result:
             self.update_status("No results to copy", "error")
             self.app.after(3000, lambda: self.update_status("Ready", "success"))
             return
 
-        formatted_text = f"""Topic: {self.worker_thread.result.topic}
+        formatted_text = f"""Topic: {self.current_result.topic}
 
-Summary: {self.worker_thread.result.summary}
+Summary: {self.current_result.summary}
 
-Sources: {', '.join(self.worker_thread.result.sources) if self.worker_thread.result.sources else 'None'}
+Sources: {', '.join(self.current_result.sources) if self.current_result.sources else 'None'}
 
-Tools Used: {', '.join(self.worker_thread.result.tools_used) if self.worker_thread.result.tools_used else 'None'}"""
+Tools Used: {', '.join(self.current_result.tools_used) if self.current_result.tools_used else 'None'}"""
 
         pyperclip.copy(formatted_text)
         self.update_status("Copied to clipboard", "success")
         self.app.after(3000, lambda: self.update_status("Ready", "success"))
 
-    def display_results(self, response: ResearchResponse):
-        """Display research results in modern card layout"""
-        # Clear previous results
-        for widget in self.results_scroll.winfo_children():
-            widget.destroy()
-
-        # Topic header
-        topic_frame = CTkFrame(master=self.results_scroll, fg_color="transparent")
-        topic_frame.pack(fill="x", padx=20, pady=(20, 10))
-
-        topic_icon = CTkLabel(master=topic_frame, text="📊", font=("Segoe UI", 24))
-        topic_icon.pack(side="left", padx=(0, 12))
-
-        topic_label = CTkLabel(
-            master=topic_frame,
-            text=response.topic,
-            font=("Segoe UI", 18, "bold"),
-            text_color=self.COLORS['text_primary'],
-            anchor="w",
-            justify="left"
-        )
-        topic_label.pack(side="left", fill="x", expand=True)
-
-        # Summary card
-        summary_card = CTkFrame(
-            master=self.results_scroll,
-            fg_color=self.COLORS['bg_secondary'],
-            corner_radius=12
-        )
-        summary_card.pack(fill="both", expand=True, padx=20, pady=15)
-
-        summary_header = CTkLabel(
-            master=summary_card,
-            text="Summary",
-            font=self.FONTS['subheading'],
-            text_color=self.COLORS['accent_primary'],
-            anchor="w"
-        )
-        summary_header.pack(fill="x", padx=20, pady=(20, 10))
+    def display_results(self, response: ResearchResponse, record_id: str = None):
+        """Show a finished result, patching the results view in place"""
+        self.current_result = response
+        self.current_record_id = record_id
+        self.show_results_view()
+        self.results_view.show(response)
+
+    def display_partial(self, fields: dict):
+        """Render the answer streamed so far, appending new summary text in place"""
+        self.show_results_view()
+        self.results_view.stream(fields)
+
+    def show_results_view(self):
+        """Swap the placeholder for the results view the first time there is something to show"""
+        if self.results_placeholder.winfo_ismapped():
+            self.results_placeholder.pack_forget()
+        if not self.results_view.winfo_ismapped():
+            self.results_view.pack(fill="both", expand=True)
+
+    def reload_history(self):
+        """Refresh the history list from the store, filtered by the search box if it has text"""
+        text = self.history_search.get().strip()
+        if text:
+            records = get_store().search(text, limit=self.HISTORY_SEARCH_LIMIT, wait_for_writes=False)
+            self.history_list.set_source(len(records), records.__getitem__)
+        else:
+            self.history_list.set_source(self.history_pager.reload(), self.history_pager.__getitem__)
 
-        summary_text = CTkTextbox(
-            master=summary_card,
-            wrap="word",
-            fg_color="transparent",
-            text_color=self.COLORS['text_primary'],
-            font=("Segoe UI", 12),
-            border_width=0,
-            height=200
-        )
-        summary_text.insert("1.0", response.summary)
-        summary_text.configure(state="disabled")
-        summary_text.pack(fill="both", expand=True, padx=20, pady=(0, 20))
-
-        # Metadata section
-        meta_frame = CTkFrame(master=self.results_scroll, fg_color="transparent")
-        meta_frame.pack(fill="x", padx=20, pady=(0, 20))
-
-        # Tools used
-        if response.tools_used:
-            tools_label = CTkLabel(
-                master=meta_frame,
-                text=f"🔧 Tools: {', '.join(response.tools_used)}",
-                font=self.FONTS['caption'],
-                text_color=self.COLORS['text_tertiary'],
-                anchor="w"
-            )
-            tools_label.pack(fill="x", pady=4)
-
-        # Sources count
-        sources_label = CTkLabel(
-            master=meta_frame,
-            text=f"📚 Sources: {len(response.sources)} found",
-            font=self.FONTS['caption'],
-            text_color=self.COLORS['text_tertiary'],
-            anchor="w"
+    def render_history_row(self, row, index: int, record: dict | None):
+        """Bind a pooled history row to a stored record"""
+        if record is None:
+            row.configure(text="", command=None)
+            return
+        created = record["created_at"][:16].replace("T", " ")
+        row.configure(text=f"{created}   {record['topic']}", command=lambda: self.on_history_selected(record))
+
+    def on_history_selected(self, record: dict):
+        """Show a stored result in the result tab"""
+        response = ResearchResponse(
+            topic=record["topic"],
+            summary=record["summary"],
+            sources=record["sources"],
+            tools_used=record["tools_used"]
         )
-        sources_label.pack(fill="x", pady=4)
+        self.display_results(response, record["id"])
+        self.results_tabs.set("Result")
 
     def update_status(self, message: str, status_type: str = "success"):
         """Update status indicator and message"""
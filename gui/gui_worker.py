@@ -1,14 +1,26 @@
 import threading
 
 class AgentWorker(threading.Thread):
-    def __init__(self, query, image_path, max_iter, callback):
+    def __init__(self, query, image_path, max_iter, callback, budget=None, fan_out=False, session=None):
         super().__init__()
         self.query = query
         self.image_path = image_path
         self.max_iter = max_iter
+        #optional RunBudget (latency SLO, token and cost caps)
+        self.budget = budget
+        #research independent sub-questions in parallel instead of one serial loop
+        self.fan_out = fan_out
+        #ResearchSession the query continues, if any
+        self.session = session
         #function to call with progress updates
         self.callback = callback
         self.result = None
+        #id of the result in the ResultStore, once saved
+        self.record_id = None
+        #AgentRun with spend and stop reason of the finished run
+        self.report = None
+        #ResearchResponse fields streamed so far
+        self.partial = None
         self.running = True
         self.daemon = True #thread dies when main exits
     
@@ -17,9 +29,8 @@ class AgentWorker(threading.Thread):
     def run(self):
         """Execute agent research query in background thread"""
         try:
-            from agent import agent_loop, ResearchResponse
-
-            import json
+            from agent import agent_loop
+            from fanout import fan_out_research
 
             if self.callback:
                 self.callback(("Starting research query...", 0))
@@ -30,29 +41,52 @@ class AgentWorker(threading.Thread):
                 if self.callback:
                     self.callback((f"[{iteration}/{max_iter}] {msg}", pct))
             
+            #keep the latest partial answer for the GUI to render while streaming
+            def partial(fields):
+                self.partial = fields
+
             #run agent loop
-            response_text = agent_loop(
-                query=self.query,
-                image_path=self.image_path,
-                max_iterations=self.max_iter,
-                progress_callback=progress
-            )
+            if self.fan_out:
+                self.report = fan_out_research(
+                    query=self.query,
+                    image_path=self.image_path,
+                    progress_callback=progress,
+                    partial_callback=partial,
+                    budget=self.budget
+                )
+            elif self.session is not None:
+                self.report = self.session.continue_session(
+                    self.query,
+                    self.image_path,
+                    max_iterations=self.max_iter,
+                    progress_callback=progress,
+                    partial_callback=partial,
+                    budget=self.budget,
+                    prefetch=True
+                )
+            else:
+                self.report = agent_loop(
+                    query=self.query,
+                    image_path=self.image_path,
+                    max_iterations=self.max_iter,
+                    progress_callback=progress,
+                    partial_callback=partial,
+                    budget=self.budget,
+                    prefetch=True
+                )
+            self.result = self.report.response
 
-            #parse json response
+            #saved from the worker so the GUI thread never waits on the store's writer
+            from store import get_store
+            store = get_store()
             try:
-                start = response_text.find("{")
-                end = response_text.rfind("}") + 1
-                json_str = response_text[start:end]
-                result_dict = json.loads(json_str)
-                self.result = ResearchResponse(**result_dict)
-            except:
-                self.result = ResearchResponse(
-                    topic="Error",
-                    summary=response_text,
-                    sources=[],
-                    tools_used=[]
-                )
-            
+                self.record_id = store.put(self.result, kind="result")
+                store.flush()
+            except RuntimeError as e:
+                #the answer is still shown, just not kept in the history
+                print(f"Warning: Could not save result: {e}")
+                self.record_id = None
+
             if self.callback:
                 self.callback(("Complete!", 100))
             
@@ -0,0 +1,232 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PartialJSONParser:
+    """Incremental parser for a streamed top-level JSON object.
+
+    Feed it the raw `partial_json` chunks of a tool_use block and it returns a
+    snapshot of the fields seen so far, with string values (and strings inside
+    arrays) filled in as far as they have arrived. Each chunk is scanned once,
+    so a long summary costs O(n) in total rather than O(n^2) re-parsing.
+    Nested objects and non-string scalars are reported once they are complete.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self._key_chars = []
+        self._raw = []
+        self._raw_depth = 0
+        self._raw_in_string = False
+        self._raw_escape = False
+
+    def feed(self, chunk: str) -> dict:
+        """Consume a chunk and return the current field snapshot"""
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        while not self.done and self._pos < len(self._buffer):
+            if not getattr(self, f"_on_{self._state}")():
+                break
+        return self.fields
+
+    # ========== STATES ==========
+    # each handler advances self._pos and returns False when it needs more input
+
+    def _skip_whitespace(self) -> bool:
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(self._buffer)
+
+    def _on_start(self) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._buffer[self._pos] != "{":
+            raise ValueError("Expected a JSON object")
+        self._pos += 1
+        self._state = "key_or_end"
+        return True
+
+    def _on_key_or_end(self) -> bool:
+        if not self._skip_whitespace():
+            return False
+        char = self._buffer[self._pos]
+        self._pos += 1
+        if char == '"':
+            self._key_chars = []
+            self._state = "key"
+        elif char == "}":
+            self.done = True
+        elif char != ",":
+            raise ValueError(f"Unexpected character {char!r} before object key")
+        return True
+
+    def _on_key(self) -> bool:
+        text, finished = self._read_string()
+        self._key_chars.append(text)
+        if finished:
+            self._key = "".join(self._key_chars)
+            self._state = "colon"
+        return finished
+
+    def _on_colon(self) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._buffer[self._pos] != ":":
+            raise ValueError("Expected ':' after object key")
+        self._pos += 1
+        self._state = "value"
+        return True
+
+    def _on_value(self) -> bool:
+        if not self._skip_whitespace():
+            return False
+        char = self._buffer[self._pos]
+        if char == '"':
+            self._pos += 1
+            self.fields[self._key] = ""
+            self._state = "string_value"
+        elif char == "[":
+            self._pos += 1
+            self.fields[self._key] = []
+            self._state = "array"
+        else:
+            self._start_raw()
+            self._state = "raw_value"
+        return True
+
+    def _on_string_value(self) -> bool:
+        text, finished = self._read_string()
+        self.fields[self._key] += text
+        if finished:
+            self._state = "after_value"
+        return finished
+
+    def _on_array(self) -> bool:
+        if not self._skip_whitespace():
+            return False
+        char = self._buffer[self._pos]
+        if char == "]":
+            self._pos += 1
+            self._state = "after_value"
+        elif char == ",":
+            self._pos += 1
+        elif char == '"':
+            self._pos += 1
+            self.fields[self._key].append("")
+            self._state = "array_string"
+        else:
+            self._start_raw()
+            self._state = "array_raw"
+        return True
+
+    def _on_array_string(self) -> bool:
+        text, finished = self._read_string()
+        self.fields[self._key][-1] += text
+        if finished:
+            self._state = "array"
+        return finished
+
+    def _on_raw_value(self) -> bool:
+        value, finished = self._read_raw()
+        if finished:
+            self.fields[self._key] = value
+            self._state = "after_value"
+        return finished
+
+    def _on_array_raw(self) -> bool:
+        value, finished = self._read_raw()
+        if finished:
+            self.fields[self._key].append(value)
+            self._state = "array"
+        return finished
+
+    def _on_after_value(self) -> bool:
+        if not self._skip_whitespace():
+            return False
+        char = self._buffer[self._pos]
+        self._pos += 1
+        if char == ",":
+            self._state = "key_or_end"
+        elif char == "}":
+            self.done = True
+        else:
+            raise ValueError(f"Unexpected character {char!r} after value")
+        return True
+
+    # ========== TOKEN READERS ==========
+
+    def _read_string(self) -> tuple[str, bool]:
+        """Decode string content up to the closing quote or the end of the buffer.
+
+        Incomplete escape sequences (and a lone high surrogate awaiting its
+        pair) are left in the buffer until the next chunk arrives.
+        """
+        out = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if char == '"':
+                self._pos += 1
+                return "".join(out), True
+            if char != "\\":
+                out.append(char)
+                self._pos += 1
+                continue
+
+            if self._pos + 1 >= len(buffer):
+                break
+            marker = buffer[self._pos + 1]
+            if marker != "u":
+                out.append(_SIMPLE_ESCAPES.get(marker, marker))
+                self._pos += 2
+                continue
+
+            if self._pos + 6 > len(buffer):
+                break
+            code = int(buffer[self._pos + 2:self._pos + 6], 16)
+            if 0xD800 <= code <= 0xDBFF:
+                if self._pos + 12 > len(buffer):
+                    break
+                low = int(buffer[self._pos + 8:self._pos + 12], 16)
+                code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                self._pos += 6
+            out.append(chr(code))
+            self._pos += 6
+        return "".join(out), False
+
+    def _start_raw(self):
+        self._raw = []
+        self._raw_depth = 0
+        self._raw_in_string = False
+        self._raw_escape = False
+
+    def _read_raw(self) -> tuple[object, bool]:
+        """Collect a non-string value until it is terminated at depth zero"""
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._raw_in_string:
+                if self._raw_escape:
+                    self._raw_escape = False
+                elif char == "\\":
+                    self._raw_escape = True
+                elif char == '"':
+                    self._raw_in_string = False
+            elif char == '"':
+                self._raw_in_string = True
+            elif char in "[{":
+                self._raw_depth += 1
+            elif char in "]}" and self._raw_depth > 0:
+                self._raw_depth -= 1
+            elif char in ",]}" and self._raw_depth == 0:
+                return json.loads("".join(self._raw)), True
+            self._raw.append(char)
+            self._pos += 1
+        return None, False
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel
+import tools
+from ratelimit import CancelToken, ToolCallCancelled
+
+
+class PrefetchStats(BaseModel):
+    """How many speculative lookups were started, cancelled and actually used"""
+    started: int = 0
+    cancelled: int = 0
+    hits: int = 0
+    hit_rate: float = 0.0
+
+
+class Prefetcher:
+    """Speculatively runs read-only lookups for the raw user query.
+
+    The lookups run in the background while the first model call is in
+    flight and land in the tool result cache, so when the model asks for the
+    same lookup, execute_tool picks up the (possibly still running) result
+    instead of starting from scratch. Lookups the model doesn't ask for are
+    cancelled if they haven't reached their backend yet (e.g. while waiting
+    on the rate limiter), so they don't spend the shared tool budgets.
+    """
+
+    def __init__(self, query: str, cache: tools.ToolResultCache = None):
+        self.cache = cache or tools.tool_cache
+        self.stats = PrefetchStats()
+        self._futures = {}
+        self._cancel_tokens = {}
+        self._executor = None
+
+        lookups = [("search", {"query": query}), ("wikipedia", {"query": query})]
+        if tools.chroma_collection is not None:
+            lookups.append(("semantic_search", {"query": query}))
+        self._lookups = {self.cache.key(name, tool_input): (name, tool_input) for name, tool_input in lookups}
+
+    def start(self):
+        """Submit every lookup; returns immediately"""
+        self._executor = ThreadPoolExecutor(max_workers=len(self._lookups), thread_name_prefix="prefetch")
+        for key, (name, tool_input) in self._lookups.items():
+            self._cancel_tokens[key] = CancelToken()
+            self._futures[key] = self._executor.submit(self._lookup, name, tool_input, self._cancel_tokens[key])
+        self.stats.started = len(self._futures)
+
+    def _lookup(self, name: str, tool_input: dict, cancel: CancelToken) -> str | None:
+        try:
+            return tools.execute_tool(name, tool_input, self.cache, cancel)
+        except ToolCallCancelled:
+            return None
+
+    def record_call(self, tool_name: str, tool_input: dict):
+        """Count a tool call by the model that a prefetch covered"""
+        key = self.cache.key(tool_name, tool_input)
+        if self._futures.pop(key, None) is not None:
+            self.stats.hits += 1
+
+    def cancel_unused(self):
+        """Cancel lookups the model hasn't asked for; ones already calling their backend finish into the cache"""
+        for key, future in self._futures.items():
+            if not future.done() and self._cancel_tokens[key].cancel():
+                self.stats.cancelled += 1
+        self._futures.clear()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def finish(self) -> PrefetchStats:
+        self.cancel_unused()
+        if self.stats.started:
+            self.stats.hit_rate = self.stats.hits / self.stats.started
+        return self.stats
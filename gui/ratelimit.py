@@ -0,0 +1,265 @@
+import os
+import random
+import threading
+import time
+
+import anthropic
+
+#Anthropic rate-limit response headers; input-token limits are preferred when present
+REQUEST_HEADERS = ("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining")
+TOKEN_HEADERS = (
+    ("anthropic-ratelimit-input-tokens-limit", "anthropic-ratelimit-input-tokens-remaining"),
+    ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining"),
+)
+
+#per-tool (burst, calls per second); unlisted tools are not throttled
+TOOL_RATES = {
+    "search": (4, 1.0),
+    "wikipedia": (5, 5.0),
+    "fetch_url": (8, 4.0),
+}
+
+
+class ToolCallCancelled(Exception):
+    """Raised when a tool call is cancelled before it reached its backend"""
+
+
+class CancelToken:
+    """Lets a caller drop a tool call that hasn't reached its backend yet.
+
+    Once start() has let the call through, cancel() no longer has any
+    effect, so a call is either dropped without spending anything or runs
+    to completion.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> bool:
+        """Cancel unless the backend call already started; returns whether it was dropped"""
+        with self._lock:
+            if self._started:
+                return False
+            self._event.set()
+            return True
+
+    def start(self) -> bool:
+        """Mark the backend call as started; False if it was cancelled first"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self._started = True
+            return True
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to `timeout` seconds, waking early (and returning True) if cancelled"""
+        return self._event.wait(timeout)
+
+
+class TokenBucket:
+    """Thread-safe token bucket that can be re-synced from server-reported limits"""
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = capacity
+        self.refill_per_s = refill_per_s
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_s)
+        self._updated = now
+
+    def acquire(self, amount: float = 1, cancel: CancelToken = None) -> bool:
+        """Block until `amount` tokens (capped at capacity) are available, then take them.
+
+        Returns False without taking anything if `cancel` is cancelled while waiting.
+        """
+        while True:
+            if cancel is not None and cancel.cancelled:
+                return False
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                amount = min(amount, self.capacity)
+                if now >= self._paused_until and self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+                wait = max(self._paused_until - now, (amount - self.tokens) / self.refill_per_s)
+            if cancel is not None:
+                cancel.wait(min(wait, 5.0))
+            else:
+                time.sleep(min(wait, 5.0))
+
+    def debit(self, amount: float):
+        """Adjust for actual usage once it is known; may go negative"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+
+    def sync(self, limit: float, remaining: float, window_s: float = 60.0):
+        """Adopt the limit and remaining count reported by the server"""
+        with self._lock:
+            self.capacity = limit
+            self.refill_per_s = limit / window_s
+            self.tokens = min(remaining, limit)
+            self._updated = time.monotonic()
+
+    def pause(self, seconds: float):
+        """Hold back every caller for `seconds` (e.g. after a retry-after)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def backoff_delay(attempt: int, base_s: float = 1.0, cap_s: float = 30.0) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap_s, base_s * 2 ** attempt))
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable_model_error(error: Exception) -> bool:
+    if isinstance(error, (anthropic.RateLimitError, anthropic.APIConnectionError, anthropic.InternalServerError)):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in (408, 409, 429, 529)
+
+
+def is_retryable_tool_error(error: Exception) -> bool:
+    """DuckDuckGo/Wikipedia throttling and transient network failures"""
+    name = type(error).__name__.lower()
+    message = str(error).lower()
+    return (
+        "ratelimit" in name or "timeout" in name or "connectionerror" in name
+        or "ratelimit" in message or "rate limit" in message or "429" in message
+    )
+
+
+#images are downscaled to about 1.15 megapixels, which costs at most ~1600 tokens (width * height / 750)
+IMAGE_TOKENS = 1600
+
+
+def _content_size(value) -> tuple[int, int]:
+    """(characters, image blocks) in request content, not counting base64 `data` payloads"""
+    if isinstance(value, dict):
+        if value.get("type") == "image":
+            return 0, 1
+        chars, images = 0, 0
+        for key, item in value.items():
+            if key == "data":
+                continue
+            item_chars, item_images = _content_size(item)
+            chars += len(key) + item_chars
+            images += item_images
+        return chars, images
+    if isinstance(value, (list, tuple)):
+        sizes = [_content_size(item) for item in value]
+        return sum(size[0] for size in sizes), sum(size[1] for size in sizes)
+    return len(value if isinstance(value, str) else str(value)), 0
+
+
+def estimate_input_tokens(request: dict) -> int:
+    """Rough input token count of a Messages API request (~4 characters per token, images at a flat rate)"""
+    chars, images = _content_size([request.get("messages", []), request.get("system", ""), request.get("tools", [])])
+    return chars // 4 + images * IMAGE_TOKENS
+
+
+class RateLimiter:
+    """Process-wide throttling and retry for model and tool calls.
+
+    Model calls draw from a requests/minute bucket and an input tokens/minute
+    bucket, both re-synced from the Anthropic rate-limit headers on every
+    response. Tools draw from their own buckets. Retryable failures back off
+    with full jitter, honouring retry-after by pausing the shared bucket so
+    concurrent sessions wait too instead of piling on more retries.
+    """
+
+    def __init__(self, requests_per_minute: int = 50, tokens_per_minute: int = 30000,
+                 max_attempts: int = 5, tool_rates: dict = None):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_attempts = max_attempts
+        self.tools = {name: TokenBucket(burst, rate) for name, (burst, rate) in (tool_rates or TOOL_RATES).items()}
+
+    def update_from_headers(self, headers) -> bool:
+        """Re-sync the model buckets from rate-limit headers; returns whether token limits were present"""
+        try:
+            limit, remaining = (headers.get(name) for name in REQUEST_HEADERS)
+            if limit and remaining:
+                self.requests.sync(float(limit), float(remaining))
+            for limit_name, remaining_name in TOKEN_HEADERS:
+                limit, remaining = headers.get(limit_name), headers.get(remaining_name)
+                if limit and remaining:
+                    self.tokens.sync(float(limit), float(remaining))
+                    return True
+        except ValueError:
+            pass
+        return False
+
+    def call_model(self, call, request: dict):
+        """Run call() -> (response, headers) for a Messages API request under the shared limits"""
+        estimate = estimate_input_tokens(request)
+        for attempt in range(self.max_attempts):
+            self.requests.acquire()
+            self.tokens.acquire(estimate)
+            try:
+                response, headers = call()
+            except Exception as e:
+                if not is_retryable_model_error(e) or attempt + 1 == self.max_attempts:
+                    raise
+                if getattr(e, "response", None) is not None:
+                    self.update_from_headers(e.response.headers)
+                self._wait(self.requests, attempt, retry_after_seconds(e))
+                continue
+
+            #without server-reported limits, correct the estimate with the actual usage
+            usage = getattr(response, "usage", None)
+            if not self.update_from_headers(headers) and usage is not None:
+                self.tokens.debit(usage.input_tokens - estimate)
+            return response
+
+    def call_tool(self, tool_name: str, call, cancel: CancelToken = None):
+        """Run call() for a tool under its bucket, retrying throttling and network errors.
+
+        Raises ToolCallCancelled if `cancel` is cancelled before call() starts.
+        """
+        bucket = self.tools.get(tool_name)
+        for attempt in range(self.max_attempts):
+            if bucket and not bucket.acquire(cancel=cancel):
+                raise ToolCallCancelled(tool_name)
+            if cancel is not None and not cancel.start():
+                raise ToolCallCancelled(tool_name)
+            try:
+                return call()
+            except Exception as e:
+                if not is_retryable_tool_error(e) or attempt + 1 == self.max_attempts:
+                    raise
+                self._wait(bucket, attempt, retry_after_seconds(e))
+
+    def _wait(self, bucket: TokenBucket | None, attempt: int, retry_after: float | None):
+        delay = backoff_delay(attempt)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+            if bucket:
+                bucket.pause(retry_after)
+        time.sleep(delay)
+
+
+#shared by every agent session in the process
+rate_limiter = RateLimiter(
+    requests_per_minute=int(os.getenv("AGENTFLOW_REQUESTS_PER_MINUTE", "50")),
+    tokens_per_minute=int(os.getenv("AGENTFLOW_TOKENS_PER_MINUTE", "30000"))
+)
@@ -0,0 +1,315 @@
+from collections import OrderedDict
+import tkinter
+import webbrowser
+from customtkinter import CTkFrame, CTkLabel, CTkScrollbar, CTkTextbox
+
+
+class VirtualList(CTkFrame):
+    """Scrollable list that only creates widgets for the rows in view.
+
+    Rows have a fixed height. A small pool of row widgets is placed on a
+    canvas and re-bound to whichever items are visible as the list scrolls,
+    so showing thousands of items costs the same as showing a screenful.
+    Items are pulled on demand through get_item(index), which lets callers
+    page data in lazily.
+    """
+
+    def __init__(self, master, make_row, render_row, row_height: int = 30, bg: str = "#1e1e2e", **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.make_row = make_row
+        self.render_row = render_row
+        self.row_height = row_height
+        self._count = 0
+        self._get_item = None
+        self._offset = 0
+        #pooled (widget, canvas window id) pairs
+        self._pool = []
+
+        self.canvas = tkinter.Canvas(self, bg=bg, highlightthickness=0, borderwidth=0)
+        self.scrollbar = CTkScrollbar(self, orientation="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        for widget in (self.canvas, self):
+            widget.bind("<MouseWheel>", self._on_mousewheel)
+            widget.bind("<Button-4>", lambda event: self.scroll_by(-3 * self.row_height))
+            widget.bind("<Button-5>", lambda event: self.scroll_by(3 * self.row_height))
+
+    def set_source(self, count: int, get_item):
+        """Show `count` items fetched with get_item(index), scrolled to the top"""
+        self._count = count
+        self._get_item = get_item
+        self._offset = 0
+        self.refresh()
+
+    def set_count(self, count: int):
+        """Change the item count (e.g. after appending) without losing the scroll position"""
+        self._count = count
+        self.refresh()
+
+    def scroll_by(self, pixels: int):
+        self._offset += pixels
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        #Windows reports multiples of 120, macOS small deltas
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_by(-step * self.row_height)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        total = self._count * self.row_height
+        if action == "moveto":
+            self._offset = int(float(value) * total)
+        elif action == "scroll":
+            view = self.canvas.winfo_height()
+            self._offset += int(value) * (view if unit == "pages" else self.row_height)
+        self.refresh()
+
+    def refresh(self):
+        """Re-bind pooled rows to the items currently in view"""
+        view = max(self.canvas.winfo_height(), 1)
+        width = max(self.canvas.winfo_width(), 1)
+        total = self._count * self.row_height
+        self._offset = max(0, min(self._offset, total - view))
+
+        needed = view // self.row_height + 2
+        while len(self._pool) < needed:
+            widget = self.make_row(self.canvas)
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                widget.bind(sequence, lambda event, s=sequence: self._forward(event, s))
+            window = self.canvas.create_window(0, 0, window=widget, anchor="nw", state="hidden")
+            self._pool.append((widget, window))
+
+        first = self._offset // self.row_height
+        for slot, (widget, window) in enumerate(self._pool):
+            index = first + slot
+            if slot >= needed or index >= self._count or self._get_item is None:
+                self.canvas.itemconfigure(window, state="hidden")
+                continue
+            self.render_row(widget, index, self._get_item(index))
+            self.canvas.coords(window, 0, index * self.row_height - self._offset)
+            self.canvas.itemconfigure(window, state="normal", width=width, height=self.row_height)
+
+        if total <= view:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self._offset / total, (self._offset + view) / total)
+
+    def _forward(self, event, sequence):
+        """Row widgets swallow wheel events; scroll the list instead"""
+        if sequence == "<MouseWheel>":
+            self._on_mousewheel(event)
+        else:
+            self.scroll_by((-3 if sequence == "<Button-4>" else 3) * self.row_height)
+
+
+class ResultsView(CTkFrame):
+    """Research result card that is built once and patched in place.
+
+    show() and stream() only touch the widgets whose content changed;
+    streamed summary text is appended rather than re-inserted, and sources
+    are listed in a VirtualList.
+    """
+
+    SUMMARY_LINE_PX = 20
+    SUMMARY_MIN_PX = 120
+    SUMMARY_MAX_PX = 600
+    SOURCES_HEIGHT_PX = 150
+
+    def __init__(self, master, colors: dict, fonts: dict, **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.colors = colors
+        self.response = None
+        self._summary = ""
+        self._sources = []
+
+        # Topic header
+        topic_frame = CTkFrame(master=self, fg_color="transparent")
+        topic_frame.pack(fill="x", padx=20, pady=(20, 10))
+        CTkLabel(master=topic_frame, text="📊", font=("Segoe UI", 24)).pack(side="left", padx=(0, 12))
+        self.topic_label = CTkLabel(
+            master=topic_frame,
+            text="",
+            font=("Segoe UI", 18, "bold"),
+            text_color=colors['text_primary'],
+            anchor="w",
+            justify="left"
+        )
+        self.topic_label.pack(side="left", fill="x", expand=True)
+
+        # Summary card
+        summary_card = CTkFrame(master=self, fg_color=colors['bg_secondary'], corner_radius=12)
+        summary_card.pack(fill="both", expand=True, padx=20, pady=15)
+        CTkLabel(
+            master=summary_card,
+            text="Summary",
+            font=fonts['subheading'],
+            text_color=colors['accent_primary'],
+            anchor="w"
+        ).pack(fill="x", padx=20, pady=(20, 10))
+        self.summary_text = CTkTextbox(
+            master=summary_card,
+            wrap="word",
+            fg_color="transparent",
+            text_color=colors['text_primary'],
+            font=("Segoe UI", 12),
+            border_width=0,
+            height=self.SUMMARY_MIN_PX
+        )
+        self.summary_text.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+        self.summary_text.configure(state="disabled")
+        self._summary_height = self.SUMMARY_MIN_PX
+
+        # Metadata section
+        meta_frame = CTkFrame(master=self, fg_color="transparent")
+        meta_frame.pack(fill="x", padx=20, pady=(0, 20))
+        self.tools_label = CTkLabel(
+            master=meta_frame,
+            text="",
+            font=fonts['caption'],
+            text_color=colors['text_tertiary'],
+            anchor="w"
+        )
+        self.tools_label.pack(fill="x", pady=4)
+        self.sources_label = CTkLabel(
+            master=meta_frame,
+            text="",
+            font=fonts['caption'],
+            text_color=colors['text_tertiary'],
+            anchor="w"
+        )
+        self.sources_label.pack(fill="x", pady=4)
+
+        self.sources_list = VirtualList(
+            meta_frame,
+            make_row=lambda master: self._make_source_row(master, fonts),
+            render_row=self._render_source,
+            row_height=24,
+            bg=colors['bg_card'],
+            height=self.SOURCES_HEIGHT_PX
+        )
+        self.sources_list.pack(fill="x", pady=(4, 0))
+
+    def _make_source_row(self, master, fonts: dict):
+        label = CTkLabel(
+            master=master,
+            text="",
+            font=fonts['caption'],
+            text_color=self.colors['accent_primary'],
+            anchor="w",
+            cursor="hand2"
+        )
+        #bound once per pooled row; CTk bindings stack, so render only swaps the item
+        label.source = ""
+        label.bind("<Button-1>", lambda event: self._open_source(label.source))
+        return label
+
+    def _render_source(self, label, index: int, source: str):
+        label.source = source
+        label.configure(text=f"{index + 1}. {source}")
+
+    @staticmethod
+    def _open_source(source: str):
+        if source.startswith(("http://", "https://")):
+            webbrowser.open(source)
+
+    def _set_label(self, label, text: str):
+        if label.cget("text") != text:
+            label.configure(text=text)
+
+    def _set_summary(self, summary: str):
+        """Append when the new summary extends the shown one, otherwise replace it"""
+        if summary == self._summary:
+            return
+        self.summary_text.configure(state="normal")
+        if summary.startswith(self._summary):
+            self.summary_text.insert("end", summary[len(self._summary):])
+        else:
+            self.summary_text.delete("1.0", "end")
+            self.summary_text.insert("1.0", summary)
+        self.summary_text.configure(state="disabled")
+        self._summary = summary
+        self._fit_summary()
+
+    def _fit_summary(self):
+        """Grow the summary box with its content instead of a fixed height"""
+        lines = self.summary_text._textbox.count("1.0", "end", "displaylines")
+        lines = lines[0] if isinstance(lines, tuple) else (lines or 1)
+        height = min(max(lines * self.SUMMARY_LINE_PX, self.SUMMARY_MIN_PX), self.SUMMARY_MAX_PX)
+        if height != self._summary_height:
+            self._summary_height = height
+            self.summary_text.configure(height=height)
+
+    def _set_sources(self, sources: list[str]):
+        if sources == self._sources:
+            return
+        appended = sources[:len(self._sources)] == self._sources
+        self._sources = list(sources)
+        self._set_label(self.sources_label, f"📚 Sources: {len(sources)} found")
+        if appended:
+            self.sources_list.set_count(len(sources))
+        else:
+            self.sources_list.set_source(len(sources), lambda index: self._sources[index])
+
+    def show(self, response):
+        """Display a complete ResearchResponse, patching only what changed"""
+        self.response = response
+        self._set_label(self.topic_label, response.topic)
+        self._set_summary(response.summary)
+        self._set_label(self.tools_label, f"🔧 Tools: {', '.join(response.tools_used)}" if response.tools_used else "")
+        self._set_sources(response.sources)
+
+    def stream(self, fields: dict):
+        """Display partial answer fields as they stream in"""
+        if isinstance(fields.get("topic"), str):
+            self._set_label(self.topic_label, fields["topic"])
+        if isinstance(fields.get("summary"), str):
+            self._set_summary(fields["summary"])
+            self.summary_text.see("end")
+        sources = fields.get("sources")
+        if isinstance(sources, list):
+            #the last source may still be arriving
+            self._set_sources([source for source in sources[:-1] if isinstance(source, str)])
+
+    def clear(self):
+        self.response = None
+        self._set_label(self.topic_label, "")
+        self._set_summary("")
+        self._set_label(self.tools_label, "")
+        self._set_sources([])
+
+
+class StorePager:
+    """Indexable view of a ResultStore's records, newest first, loaded a page at a time.
+
+    Only the pages a VirtualList actually asks for are queried, and at most
+    max_pages of them are kept, so scrolling through a large history never
+    loads it all into memory. Reads don't wait for queued writes, so paging
+    from the GUI thread never blocks on other sessions saving results.
+    """
+
+    def __init__(self, store, page_size: int = 50, max_pages: int = 8):
+        self.store = store
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.count = 0
+        self._pages = OrderedDict()
+
+    def reload(self) -> int:
+        """Drop cached pages and re-count the stored records"""
+        self._pages.clear()
+        self.count = self.store.count(wait_for_writes=False)
+        return self.count
+
+    def __getitem__(self, index: int) -> dict | None:
+        number, position = divmod(index, self.page_size)
+        page = self._pages.get(number)
+        if page is None:
+            page = self.store.recent(limit=self.page_size, offset=number * self.page_size, wait_for_writes=False)
+            self._pages[number] = page
+            if len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(number)
+        return page[position] if position < len(page) else None
@@ -0,0 +1,55 @@
+import os
+from pydantic import BaseModel, Field
+
+
+class ModelRoute(BaseModel):
+    """Which model handles which kind of turn.
+
+    Tool-selection turns go to the fast model; the final synthesis, and any
+    turn where the fast model's output is malformed or its call fails (e.g.
+    the model was retired), go to the strong model.
+    Setting both models to the same name disables the cascade.
+    """
+    fast_model: str = Field(default_factory=lambda: os.getenv("AGENTFLOW_FAST_MODEL", "claude-haiku-4-5"))
+    fast_max_tokens: int = 1024
+    strong_model: str = Field(default_factory=lambda: os.getenv("AGENTFLOW_STRONG_MODEL", "claude-sonnet-4-6"))
+    strong_max_tokens: int = 4096
+
+    @property
+    def cascading(self) -> bool:
+        return self.fast_model != self.strong_model
+
+
+class RouteDecision(BaseModel):
+    """One model call made by a run and why that model was picked"""
+    iteration: int
+    model: str
+    #tool_selection, synthesis, escalated_synthesis, escalated_malformed, escalated_error,
+    #or plan/merge in fan-out mode
+    reason: str
+
+
+def review_fast_response(response, tools: list[dict], final_tool: str) -> str | None:
+    """Decide whether a fast-model response must be redone by the strong model.
+
+    Returns "synthesis" when the fast model wants to answer (it called the
+    final tool or stopped calling tools), "malformed" when it was cut off or
+    called a tool that doesn't exist or without its required inputs, and
+    None when the response can be used as is.
+    """
+    if response.stop_reason == "max_tokens":
+        return "malformed"
+
+    required = {tool["name"]: tool["input_schema"].get("required", []) for tool in tools}
+    tool_calls = [block for block in response.content if block.type == "tool_use"]
+    if not tool_calls:
+        return "synthesis"
+
+    for block in tool_calls:
+        if block.name == final_tool:
+            return "synthesis"
+        if block.name not in required or not isinstance(block.input, dict):
+            return "malformed"
+        if any(not block.input.get(field) for field in required[block.name]):
+            return "malformed"
+    return None
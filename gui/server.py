@@ -0,0 +1,344 @@
+import asyncio
+import base64
+import binascii
+import json
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from agent import agent_loop
+from fanout import fan_out_research
+from budget import RunBudget
+from store import get_store
+
+MEDIA_SUFFIXES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp"
+}
+
+
+class ServiceBusy(Exception):
+    """Raised when a query can't be admitted; carries the reason for the 429"""
+
+
+class Job:
+    """A submitted research query and the events it has produced so far"""
+
+    def __init__(self, client_id: str, query: str, image_path: str | None, fan_out: bool = False):
+        self.id = uuid.uuid4().hex
+        self.client_id = client_id
+        self.query = query
+        self.image_path = image_path
+        self.fan_out = fan_out
+        self.status = "queued"
+        self.created = time.time()
+        self.result = None
+        self.error = None
+        self.events = []
+        self._updated = asyncio.Event()
+        self._summary_sent = ""
+        self._topic_sent = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def publish(self, event: dict):
+        """Append an event and wake every stream waiting on this job (event loop thread only)"""
+        self.events.append(event)
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def wait_for_events(self, seen: int):
+        """Wait until there are more than `seen` events"""
+        updated = self._updated
+        if len(self.events) <= seen:
+            await updated.wait()
+
+    def partial_event(self, fields: dict) -> dict | None:
+        """Turn a partial answer snapshot into an event carrying only the new summary text.
+
+        If the summary no longer extends what was sent, the event has reset
+        set and carries the whole summary, which replaces the earlier text.
+        """
+        summary = fields.get("summary")
+        if not isinstance(summary, str):
+            summary = ""
+        #a retried answer starts over; clients must drop the text they have so far
+        reset = not summary.startswith(self._summary_sent)
+        delta = summary if reset else summary[len(self._summary_sent):]
+        self._summary_sent = summary
+        #the topic is only sent when it changes; other fields (e.g. sources) don't produce events
+        topic = fields.get("topic") if isinstance(fields.get("topic"), str) else None
+        if topic == self._topic_sent:
+            topic = None
+        elif topic is not None:
+            self._topic_sent = topic
+        if not delta and topic is None and not reset:
+            return None
+        return {"type": "token", "topic": topic, "summary_delta": delta, "reset": reset}
+
+    def snapshot(self) -> dict:
+        data = {"id": self.id, "status": self.status, "query": self.query, "created": self.created}
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class ResearchService:
+    """Runs agent_loop for many clients from one process.
+
+    Queries wait in a bounded queue and are picked up by a fixed pool of
+    async workers, each running the blocking agent loop on its own thread.
+    A full queue, or a client that already has max_per_client queries queued
+    or running, is rejected with ServiceBusy instead of piling up.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 32, max_per_client: int = 2,
+                 max_iterations: int = 10, budget: RunBudget | None = None, retained_jobs: int = 1000):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_per_client = max_per_client
+        self.max_iterations = max_iterations
+        self.budget = budget
+        self.retained_jobs = retained_jobs
+        self.jobs = OrderedDict()
+        self._active_per_client = {}
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="research")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, client_id: str, query: str, image: bytes | None = None,
+               media_type: str = "image/png", fan_out: bool = False) -> Job:
+        """Admit a query or raise ServiceBusy"""
+        if self._active_per_client.get(client_id, 0) >= self.max_per_client:
+            raise ServiceBusy(f"Client already has {self.max_per_client} queries in progress")
+        if self._queue.full():
+            raise ServiceBusy("Research queue is full")
+
+        image_path = None
+        if image:
+            with tempfile.NamedTemporaryFile(suffix=MEDIA_SUFFIXES.get(media_type, ".png"), delete=False) as f:
+                f.write(image)
+                image_path = f.name
+
+        job = Job(client_id, query, image_path, fan_out)
+        self._queue.put_nowait(job)
+        self._active_per_client[client_id] = self._active_per_client.get(client_id, 0) + 1
+        self.jobs[job.id] = job
+        self._evict_finished()
+        job.publish({"type": "status", "status": job.status})
+        return job
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "queue_size": self.queue_size,
+            "workers": self.workers,
+            "running": sum(1 for job in self.jobs.values() if job.status == "running")
+        }
+
+    def _evict_finished(self):
+        while len(self.jobs) > self.retained_jobs:
+            oldest = next((job_id for job_id, job in self.jobs.items() if job.finished), None)
+            if oldest is None:
+                return
+            del self.jobs[oldest]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job, loop)
+            finally:
+                self._active_per_client[job.client_id] -= 1
+                if not self._active_per_client[job.client_id]:
+                    del self._active_per_client[job.client_id]
+                if job.image_path:
+                    os.unlink(job.image_path)
+                self._queue.task_done()
+
+    async def _run(self, job: Job, loop):
+        job.status = "running"
+        job.publish({"type": "status", "status": job.status})
+
+        #agent callbacks fire on the worker thread; hop back to the event loop to publish
+        def progress(iteration, max_iter, msg):
+            event = {"type": "progress", "iteration": iteration, "max_iterations": max_iter, "message": msg}
+            loop.call_soon_threadsafe(job.publish, event)
+
+        def partial(fields):
+            event = job.partial_event(fields)
+            if event:
+                loop.call_soon_threadsafe(job.publish, event)
+
+        try:
+            if job.fan_out:
+                research = lambda: fan_out_research(
+                    query=job.query,
+                    image_path=job.image_path,
+                    progress_callback=progress,
+                    partial_callback=partial,
+                    budget=self.budget
+                )
+            else:
+                research = lambda: agent_loop(
+                    query=job.query,
+                    image_path=job.image_path,
+                    max_iterations=self.max_iterations,
+                    progress_callback=progress,
+                    partial_callback=partial,
+                    budget=self.budget,
+                    prefetch=True
+                )
+            run = await loop.run_in_executor(self._executor, research)
+            get_store().put(run.response, kind="api")
+            job.result = run.model_dump()
+            job.status = "done"
+            job.publish({"type": "result", "result": job.result})
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+            job.publish({"type": "error", "error": job.error})
+
+
+# ========== HTTP ==========
+
+def client_id_for(request: Request) -> str:
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "anonymous")
+
+
+def busy_response(message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=429, headers={"Retry-After": "5"})
+
+
+async def submit_research(request: Request) -> JSONResponse:
+    """POST /research {"query": str, "image": base64 str?, "media_type": str?, "fan_out": bool?}"""
+    service = request.app.state.service
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return JSONResponse({"error": "Body must be JSON"}, status_code=400)
+
+    query = body.get("query") if isinstance(body, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        return JSONResponse({"error": "query is required"}, status_code=400)
+
+    image = None
+    if body.get("image"):
+        try:
+            image = base64.b64decode(body["image"], validate=True)
+        except (binascii.Error, TypeError):
+            return JSONResponse({"error": "image must be base64 encoded"}, status_code=400)
+
+    try:
+        job = service.submit(client_id_for(request), query, image, body.get("media_type", "image/png"),
+                             bool(body.get("fan_out")))
+    except ServiceBusy as e:
+        return busy_response(str(e))
+
+    return JSONResponse(
+        {"id": job.id, "status": job.status, "events": f"/research/{job.id}/events"},
+        status_code=202
+    )
+
+
+async def get_research(request: Request) -> JSONResponse:
+    """GET /research/{job_id}"""
+    job = request.app.state.service.jobs.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Unknown research id"}, status_code=404)
+    return JSONResponse(job.snapshot())
+
+
+async def stream_research(request: Request):
+    """GET /research/{job_id}/events: replay past events, then stream new ones as SSE"""
+    job = request.app.state.service.jobs.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Unknown research id"}, status_code=404)
+
+    async def events():
+        seen = 0
+        while True:
+            while seen < len(job.events):
+                event = job.events[seen]
+                seen += 1
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            if job.finished:
+                return
+            try:
+                await asyncio.wait_for(job.wait_for_events(seen), timeout=15)
+            except asyncio.TimeoutError:
+                #keep idle connections alive through proxies
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse(request.app.state.service.stats())
+
+
+def create_app(service: ResearchService | None = None) -> Starlette:
+    """Build the ASGI app. The Anthropic client honours ANTHROPIC_BASE_URL,
+    so the service can be pointed at a local mock of the API.
+    """
+    service = service or ResearchService(
+        workers=int(os.getenv("AGENTFLOW_WORKERS", "4")),
+        queue_size=int(os.getenv("AGENTFLOW_QUEUE_SIZE", "32")),
+        max_per_client=int(os.getenv("AGENTFLOW_MAX_PER_CLIENT", "2"))
+    )
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await service.start()
+        yield
+        await service.stop()
+
+    app = Starlette(
+        routes=[
+            Route("/research", submit_research, methods=["POST"]),
+            Route("/research/{job_id}", get_research, methods=["GET"]),
+            Route("/research/{job_id}/events", stream_research, methods=["GET"]),
+            Route("/health", health, methods=["GET"])
+        ],
+        lifespan=lifespan
+    )
+    app.state.service = service
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        create_app(),
+        host=os.getenv("AGENTFLOW_HOST", "127.0.0.1"),
+        port=int(os.getenv("AGENTFLOW_PORT", "8000"))
+    )
@@ -0,0 +1,147 @@
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from agent import FINAL_ANSWER_PROMPT, AgentRun, ResearchResponse, agent_loop
+from ratelimit import estimate_input_tokens
+from tools import ToolResultCache, tool_cache
+
+#tool results fetched in a session stay valid for its follow-ups
+SESSION_CACHE_TTL_S = 24 * 3600
+
+#once the history passes either limit, older turns are folded into a short recap and only
+#the last KEEP_TURNS are sent in full; dropping several at once keeps the cached prefix
+#stable for the turns in between
+MAX_HISTORY_TURNS = 6
+MAX_HISTORY_TOKENS = 50_000
+KEEP_TURNS = 3
+RECAP_ANSWERS = 10
+RECAP_SUMMARY_CHARS = 300
+RECAP_HEADER = "Earlier in this session you answered:"
+
+
+def _turn_starts(messages: list[dict]) -> list[int]:
+    """Indices of the user messages that start a new question"""
+    starts = []
+    for index, message in enumerate(messages):
+        if message["role"] != "user" or isinstance(message["content"], str):
+            continue
+        if any(
+            block.get("type") == "image" or (block.get("type") == "text" and block.get("text") != FINAL_ANSWER_PROMPT)
+            for block in message["content"]
+        ):
+            starts.append(index)
+    return starts
+
+
+class ResearchSession:
+    """A multi-turn research conversation that follow-up questions build on.
+
+    The session keeps the full message history and every tool result fetched
+    so far. continue_session() sends the earlier turns as a cached prompt
+    prefix and answers repeated lookups from the session's cache, so a
+    follow-up only pays for what is new. Sessions are saved as JSON after
+    every turn and can be reloaded after a restart.
+    """
+
+    def __init__(self, session_id: str = None, title: str = "", messages: list[dict] = None,
+                 responses: list[dict] = None, tool_results: list[list] = None,
+                 created_at: float = None, updated_at: float = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.title = title
+        self.messages = messages or []
+        self.responses = [ResearchResponse(**response) for response in responses or []]
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        self.tool_cache = ToolResultCache(max_entries=1024, ttl_s=SESSION_CACHE_TTL_S, parent=tool_cache)
+        self.tool_cache.seed(tool_results or [])
+
+    @property
+    def path(self) -> Path:
+        return session_dir() / f"{self.id}.json"
+
+    def compacted_history(self) -> list[dict]:
+        """The history to continue from: turns beyond the size limits are replaced by a
+        recap of their answers. Kept turns are sent unchanged, screenshots included, so
+        follow-ups can still refer to them and the prompt cache prefix stays valid.
+        """
+        messages = list(self.messages)
+        starts = _turn_starts(messages)
+        keep = KEEP_TURNS if len(starts) > MAX_HISTORY_TURNS else len(starts)
+        while keep > 1 and estimate_input_tokens({"messages": messages[starts[-keep]:]}) > MAX_HISTORY_TOKENS:
+            keep -= 1
+        if keep >= len(starts):
+            return messages
+
+        #the first kept turn answers the dropped turn's open tool calls and carries an old recap; drop both
+        messages = messages[starts[-keep]:]
+        content = [
+            block for block in messages[0]["content"]
+            if block.get("type") != "tool_result" and not str(block.get("text", "")).startswith(RECAP_HEADER)
+        ]
+        dropped = self.responses[:len(self.responses) - keep][-RECAP_ANSWERS:]
+        recap = "\n".join(f"- {answer.topic}: {answer.summary[:RECAP_SUMMARY_CHARS]}" for answer in dropped)
+        messages[0] = {**messages[0], "content": [{"type": "text", "text": f"{RECAP_HEADER}\n{recap}"}] + content}
+        return messages
+
+    def continue_session(self, query: str, image_path: str = None, **loop_kwargs) -> AgentRun:
+        """Ask a (follow-up) question in this session and save the result.
+
+        Extra keyword arguments go to agent_loop. The history is only
+        updated if the turn completes.
+        """
+        messages = self.compacted_history()
+        run = agent_loop(query, image_path, history=messages, tool_cache=self.tool_cache, **loop_kwargs)
+
+        self.messages = messages
+        self.responses.append(run.response)
+        self.title = self.title or run.response.topic
+        self.updated_at = time.time()
+        self.save()
+        return run
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "messages": self.messages,
+            "responses": [response.model_dump() for response in self.responses],
+            "tool_results": self.tool_cache.export()
+        }
+
+    def save(self):
+        """Write the session atomically to the session directory"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix(".tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(temp, self.path)
+
+    @classmethod
+    def load(cls, session_id: str) -> "ResearchSession":
+        with open(session_dir() / f"{session_id}.json", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            session_id=data["id"],
+            title=data.get("title", ""),
+            messages=data.get("messages"),
+            responses=data.get("responses"),
+            tool_results=data.get("tool_results"),
+            created_at=data.get("created_at"),
+            updated_at=data.get("updated_at")
+        )
+
+    @classmethod
+    def latest(cls) -> "ResearchSession | None":
+        """The most recently updated saved session, if any"""
+        saved = sorted(session_dir().glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in saved:
+            try:
+                return cls.load(path.stem)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Could not load session {path.name}: {e}")
+        return None
@@ -0,0 +1,293 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+ACTIVE_SEGMENT = "results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    rowid INTEGER PRIMARY KEY,
+    record_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    tools_used TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_topic_time ON results(topic COLLATE NOCASE, created_at);
+CREATE INDEX IF NOT EXISTS idx_results_time ON results(created_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+    topic, summary, content='results', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS results_fts_insert AFTER INSERT ON results BEGIN
+    INSERT INTO results_fts(rowid, topic, summary) VALUES (new.rowid, new.topic, new.summary);
+END;
+"""
+
+COLUMNS = "record_id, created_at, kind, topic, summary, sources, tools_used"
+
+_STOP = object()
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _row_to_record(row) -> dict:
+    record_id, created_at, kind, topic, summary, sources, tools_used = row
+    return {
+        "id": record_id,
+        "created_at": datetime.fromtimestamp(created_at).isoformat(),
+        "kind": kind,
+        "topic": topic,
+        "summary": summary,
+        "sources": json.loads(sources),
+        "tools_used": json.loads(tools_used),
+    }
+
+
+def _fts_query(text: str) -> str:
+    """Quote each term so user text can't trip the FTS5 query syntax"""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+class ResultStore:
+    """SQLite (WAL) store for research results with a buffered background writer.
+
+    Writes are queued and committed in batches by a single writer thread, so
+    concurrent sessions never interleave partial records. The active segment
+    is rotated once it grows past max_bytes; reads fan out over all segments.
+    """
+
+    def __init__(self, directory: str = "./research_store", max_bytes: int = 64 * 1024 * 1024,
+                 batch_size: int = 64, flush_interval: float = 0.5):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        #guards segment rotation against readers opening the active file
+        self._segments_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        #write failures since the last flush(), raised from it
+        self._errors = []
+        self._errors_lock = threading.Lock()
+
+        self._conn = _connect(self.directory / ACTIVE_SEGMENT)
+        self._writer = threading.Thread(target=self._write_loop, name="result-store-writer", daemon=True)
+        self._writer.start()
+
+    # ========== WRITES ==========
+
+    def put(self, result, kind: str = "result") -> str:
+        """Queue a result (pydantic model or dict) for writing and return its record id"""
+        if self._closed:
+            raise RuntimeError("Result store is closed")
+
+        data = result.model_dump() if hasattr(result, "model_dump") else dict(result)
+        record_id = uuid.uuid4().hex
+        row = (
+            record_id,
+            time.time(),
+            kind,
+            str(data.get("topic") or "Untitled"),
+            str(data.get("summary") or ""),
+            json.dumps(list(data.get("sources") or []), ensure_ascii=False),
+            json.dumps(list(data.get("tools_used") or []), ensure_ascii=False),
+        )
+        self._queue.put(row)
+        return record_id
+
+    def flush(self):
+        """Block until every queued write has been committed.
+
+        Raises RuntimeError if any write since the last flush failed; the
+        failed rows are not in the store.
+        """
+        self._queue.join()
+        with self._errors_lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            failed = sum(count for count, _ in errors)
+            raise RuntimeError(f"Could not write {failed} result(s): {errors[-1][1]}")
+
+    def close(self):
+        """Flush pending writes and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._conn.close()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+
+            #gather more rows until the batch is full or the flush interval passes
+            while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            rows = [row for row in batch if row is not _STOP]
+            try:
+                if rows:
+                    with self._conn:
+                        self._conn.executemany(
+                            f"INSERT INTO results ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                        )
+                    self._maybe_rotate()
+            except Exception as e:
+                print(f"Warning: Could not write {len(rows)} result(s): {e}")
+                with self._errors_lock:
+                    self._errors.append((len(rows), e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if len(rows) != len(batch):
+                return
+
+    def _maybe_rotate(self):
+        active = self.directory / ACTIVE_SEGMENT
+        wal = active.with_name(active.name + "-wal")
+        size = active.stat().st_size + (wal.stat().st_size if wal.exists() else 0)
+        if size < self.max_bytes:
+            return
+
+        with self._segments_lock:
+            #automatic checkpoints leave the WAL file at its largest size, so fold it
+            #into the database and measure that; a large WAL alone doesn't rotate
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if active.stat().st_size < self.max_bytes:
+                return
+            self._conn.close()
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            try:
+                active.rename(self.directory / f"results-{stamp}.db")
+                for suffix in ("-wal", "-shm"):
+                    leftover = active.with_name(active.name + suffix)
+                    if leftover.exists():
+                        leftover.unlink()
+            except OSError as e:
+                #e.g. a reader has the file open on Windows; keep writing and retry after the next batch
+                print(f"Warning: Could not rotate result store segment: {e}")
+            finally:
+                #a fresh segment after a rename, otherwise the old one reopened
+                self._conn = _connect(active)
+
+    # ========== READS ==========
+
+    def _segments(self) -> list[Path]:
+        """Segment files, newest first"""
+        rotated = sorted(self.directory.glob("results-*.db"), reverse=True)
+        return [self.directory / ACTIVE_SEGMENT] + rotated
+
+    def _query(self, sql: str, params: tuple = (), wait_for_writes: bool = True) -> list:
+        #reads see every queued write unless the caller can't afford to block
+        #(e.g. the GUI thread); failures are reported by flush(), not here
+        if wait_for_writes:
+            self._queue.join()
+        with self._segments_lock:
+            conns = [sqlite3.connect(path, timeout=10) for path in self._segments() if path.exists()]
+
+        rows = []
+        for conn in conns:
+            try:
+                rows.extend(conn.execute(sql, params).fetchall())
+            finally:
+                conn.close()
+        return rows
+
+    def get(self, record_id: str) -> dict | None:
+        """Fetch a single record by id"""
+        rows = self._query(f"SELECT {COLUMNS} FROM results WHERE record_id = ?", (record_id,))
+        return _row_to_record(rows[0]) if rows else None
+
+    def recent(self, limit: int = 50, offset: int = 0, since: float | None = None,
+               wait_for_writes: bool = True) -> list[dict]:
+        """Most recent records first, optionally only those created after `since` (epoch seconds)"""
+        since = since if since is not None else 0.0
+        rows = self._query(
+            f"SELECT {COLUMNS} FROM results WHERE created_at >= ? ORDER BY created_at DESC LIMIT ?",
+            (since, limit + offset),
+            wait_for_writes,
+        )
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return [_row_to_record(row) for row in rows[offset:offset + limit]]
+
+    def by_topic(self, topic: str, since: float | None = None, until: float | None = None,
+                 limit: int = 50) -> list[dict]:
+        """Records for a topic (case-insensitive) within an optional time window"""
+        since = since if since is not None else 0.0
+        until = until if until is not None else time.time() + 1
+        rows = self._query(
+            f"SELECT {COLUMNS} FROM results WHERE topic = ? COLLATE NOCASE "
+            "AND created_at BETWEEN ? AND ? ORDER BY created_at DESC LIMIT ?",
+            (topic, since, until, limit),
+        )
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return [_row_to_record(row) for row in rows[:limit]]
+
+    def search(self, text: str, limit: int = 20, wait_for_writes: bool = True) -> list[dict]:
+        """Full-text search over topics and summaries, best matches first"""
+        match = _fts_query(text)
+        if not match:
+            return []
+        columns = ", ".join(f"r.{column.strip()}" for column in COLUMNS.split(","))
+        rows = self._query(
+            f"SELECT {columns}, bm25(results_fts) AS rank FROM results_fts "
+            "JOIN results r ON r.rowid = results_fts.rowid "
+            "WHERE results_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit),
+            wait_for_writes,
+        )
+        rows.sort(key=lambda row: row[-1])
+        return [_row_to_record(row[:-1]) for row in rows[:limit]]
+
+    def count(self, wait_for_writes: bool = True) -> int:
+        return sum(row[0] for row in self._query("SELECT COUNT(*) FROM results", (), wait_for_writes))
+
+    def export_json(self, filename: str, record_ids: list[str]) -> str:
+        """Write the given records to a JSON file and return its path"""
+        records = [record for record in (self.get(rid) for rid in record_ids) if record]
+        payload = records[0] if len(records) == 1 else records
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        return filename
+
+
+#process-wide store shared by the agent tools and the GUI
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ResultStore:
+    """Return the shared result store, creating it on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore(os.getenv("AGENTFLOW_STORE_DIR", "./research_store"))
+            atexit.register(_store.close)
+        return _store
@@ -1,18 +1,23 @@
 from langchain_community.tools import WikipediaQueryRun, DuckDuckGoSearchRun
 from langchain_community.utilities import WikipediaAPIWrapper
 from langchain.tools import tool, ToolRuntime
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+import json
+import os
+import threading
+import time
 import chromadb
 from chromadb.config import Settings
+from store import get_store
+from ratelimit import CancelToken, ToolCallCancelled, rate_limiter
+from wiki_offline import OfflineWikipedia
+from fetch import PageFetcher
 
-def save_to_txt(data: str, filename: str = "research_output.txt"):
-    timestamp = datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
-    formatted_text = f"-- Research Output -- \nTimestamp: {timestamp}\n\n{data}\n\n"
-
-    with open(filename, "a", encoding = "utf-8") as f:
-        f.write(formatted_text)
-
-    return f"Data succesfully saved to {filename}"
+def save_result(data: str, topic: str = "Untitled") -> str:
+    """Queue research notes for the shared result store"""
+    record_id = get_store().put({"topic": topic, "summary": data}, kind="note")
+    return f"Data successfully saved to the result store (id: {record_id})"
 
 #global chromadb client and collection
 
@@ -83,6 +88,109 @@ api_wrapper = WikipediaAPIWrapper(
 )
 wiki_tool = WikipediaQueryRun(api_wrapper=api_wrapper)
 
+#local dump index (see wiki_offline.py); the live API is only used as a fallback
+wiki_offline = OfflineWikipedia.from_env()
+WIKI_LIVE_FALLBACK = os.getenv("AGENTFLOW_WIKI_FALLBACK", "1") == "1"
+
+
+def wikipedia_lookup(query: str, section: str = None, cancel: CancelToken = None) -> str:
+    """Look up Wikipedia in the offline index first, then the live API if allowed"""
+    if wiki_offline is not None:
+        result = wiki_offline.lookup(query, section)
+        if result:
+            return result
+        if not WIKI_LIVE_FALLBACK:
+            return f"No offline Wikipedia article found for '{query}'"
+    return rate_limiter.call_tool("wikipedia", lambda: wiki_tool.run(query), cancel)
+
+
+#shared pooled HTTP client and extraction cache for fetch_url
+_page_fetcher = None
+_page_fetcher_lock = threading.Lock()
+MAX_FETCH_URLS = 5
+
+
+def get_page_fetcher() -> PageFetcher:
+    """Return the shared page fetcher, creating it (and its cache directory) on first use"""
+    global _page_fetcher
+    with _page_fetcher_lock:
+        if _page_fetcher is None:
+            _page_fetcher = PageFetcher(os.getenv("AGENTFLOW_FETCH_CACHE", "./fetch_cache"))
+        return _page_fetcher
+
+#(limit, kept chars) before a tool result is truncated; pages need more room than snippets
+RESULT_LIMITS = {
+    "fetch_url": (16000, 15000),
+}
+DEFAULT_RESULT_LIMIT = (1000, 800)
+
+#read-only tools whose results can be reused for identical inputs
+CACHEABLE_TOOLS = {"search", "wikipedia", "semantic_search"}
+
+class ToolResultCache:
+    """Thread-safe LRU cache of tool results keyed by tool name and normalized input.
+
+    Entries are futures, so a call that arrives while an identical call is
+    still running (e.g. a speculative prefetch) waits for it instead of
+    hitting the backend again.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_s: float = 900, parent: "ToolResultCache" = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        #misses are looked up in the parent cache (e.g. a session cache over the shared one)
+        self.parent = parent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool_name: str, tool_input: dict) -> tuple[str, str]:
+        normalized = dict(tool_input)
+        if isinstance(normalized.get("query"), str):
+            normalized["query"] = " ".join(normalized["query"].lower().split())
+        return tool_name, json.dumps(normalized, sort_keys=True)
+
+    def claim(self, key) -> tuple[Future, bool]:
+        """Return the future for key and whether the caller owns (must compute) it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl_s:
+                self._entries.move_to_end(key)
+                return entry[1], False
+
+            future = Future()
+            self._entries[key] = (time.monotonic(), future)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return future, True
+
+    def export(self) -> list[list]:
+        """Completed (tool, input, result) entries, oldest first, for serialization"""
+        with self._lock:
+            entries = list(self._entries.items())
+        return [
+            [tool_name, input_json, future.result()]
+            for (tool_name, input_json), (_, future) in entries
+            if future.done() and not future.cancelled()
+        ]
+
+    def seed(self, entries: list[list]):
+        """Load entries produced by export()"""
+        for tool_name, input_json, result in entries:
+            future, owner = self.claim((tool_name, input_json))
+            if owner:
+                future.set_result(result)
+
+    def discard(self, key, future: Future):
+        """Drop an entry (e.g. an error result) unless it was already replaced"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] is future:
+                del self._entries[key]
+
+#process-wide cache shared by all agent runs
+tool_cache = ToolResultCache()
+
 
 def get_tool_schemas() -> list[dict]:
     """Return tool definitions in Claude Agent SDK format (JSON Schema)"""
@@ -110,14 +218,33 @@ def get_tool_schemas() -> list[dict]:
                     "query": {
                         "type": "string",
                         "description": "The topic to search for on Wikipedia"
+                    },
+                    "section": {
+                        "type": "string",
+                        "description": "Optional section heading to read instead of the article summary"
                     }
                 },
                 "required": ["query"]
             }
         },
+        {
+            "name": "fetch_url",
+            "description": "Fetch web pages and return their main text. Use this to read sources found with search instead of searching again.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "urls": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": f"One or more http(s) URLs to read (at most {MAX_FETCH_URLS}); they are fetched concurrently"
+                    }
+                },
+                "required": ["urls"]
+            }
+        },
         {
             "name": "save",
-            "description": "Save research findings to a text file for later reference.",
+            "description": "Save research findings to the result store for later reference.",
             "input_schema": {
                 "type": "object",
                 "properties": {
@@ -125,9 +252,9 @@ def get_tool_schemas() -> list[dict]:
                         "type": "string",
                         "description": "The research data/summary to save"
                     },
-                    "filename": {
+                    "topic": {
                         "type": "string",
-                        "description": "The filename to save to (default: research_output.txt)"
+                        "description": "Short topic title used to index the saved findings"
                     }
                 },
                 "required": ["data"]
@@ -154,37 +281,87 @@ def get_tool_schemas() -> list[dict]:
     ]
 
 
-def execute_tool(tool_name: str, tool_input: dict) -> str:
-    """Execute a tool by name and return the result as a string"""
+def execute_tool(tool_name: str, tool_input: dict, cache: ToolResultCache = None, cancel: CancelToken = None) -> str:
+    """Execute a tool by name and return the result as a string.
+
+    Read-only tools are served from the tool result cache (the shared one by
+    default) when an identical call has already run or is still running.
+    A call made with a CancelToken raises ToolCallCancelled if cancelled
+    before reaching its backend; anyone waiting on it then runs it themselves.
+    """
+    if tool_name not in CACHEABLE_TOOLS:
+        return run_tool(tool_name, tool_input, cancel)
+
+    cache = cache or tool_cache
+    key = cache.key(tool_name, tool_input)
+    future, owner = cache.claim(key)
+    if not owner:
+        try:
+            return future.result()
+        except CancelledError:
+            #the call we were waiting on was a prefetch that got cancelled
+            return execute_tool(tool_name, tool_input, cache, cancel)
+
+    try:
+        if cache.parent is not None:
+            result = execute_tool(tool_name, tool_input, cache.parent, cancel)
+        else:
+            result = run_tool(tool_name, tool_input, cancel)
+    except ToolCallCancelled:
+        cache.discard(key, future)
+        future.cancel()
+        raise
+    if result.startswith("Error"):
+        cache.discard(key, future)
+    future.set_result(result)
+    return result
+
+
+def run_tool(tool_name: str, tool_input: dict, cancel: CancelToken = None) -> str:
+    """Run a tool by name without consulting the cache"""
     try:
         if tool_name == "search":
             query = tool_input.get("query", "")
             if not query:
                 return "Error: search query is required"
-            result = search_tool.run(query)
+            result = rate_limiter.call_tool("search", lambda: search_tool.run(query), cancel)
         elif tool_name == "wikipedia":
             query = tool_input.get("query", "")
             if not query:
                 return "Error: wikipedia query is required"
-            result = wiki_tool.run(query)
+            result = wikipedia_lookup(query, tool_input.get("section"), cancel)
+        elif tool_name == "fetch_url":
+            urls = tool_input.get("urls") or []
+            if isinstance(urls, str):
+                urls = [urls]
+            if not urls:
+                return "Error: fetch_url needs at least one URL"
+            result = get_page_fetcher().fetch_many(urls[:MAX_FETCH_URLS])
         elif tool_name == "save":
             data = tool_input.get("data", "")
-            filename = tool_input.get("filename", "research_output.txt")
-            result = save_to_txt(data, filename)
+            if not data:
+                return "Error: save data is required"
+            topic = tool_input.get("topic") or "Untitled"
+            result = save_result(data, topic)
         elif tool_name == "semantic_search":
             query = tool_input.get("query", "")
             top_k = tool_input.get("top_k", 5)
+            if cancel is not None and not cancel.start():
+                raise ToolCallCancelled(tool_name)
             result = semantic_search(query, top_k)
         else:
-            return f"Error: Tool '{tool_name}' not found. Available tools: search, wikipedia, save"
+            return f"Error: Tool '{tool_name}' not found. Available tools: search, wikipedia, fetch_url, save, semantic_search"
 
         # Convert result to string if needed
         result_str = str(result)
 
-        # Summarize if too long (>1000 chars) to conserve tokens
-        if len(result_str) > 1000:
-            result_str = result_str[:800] + "\n[...truncated...]"
+        # Summarize if too long to conserve tokens
+        limit, keep = RESULT_LIMITS.get(tool_name, DEFAULT_RESULT_LIMIT)
+        if len(result_str) > limit:
+            result_str = result_str[:keep] + "\n[...truncated...]"
 
         return result_str
+    except ToolCallCancelled:
+        raise
     except Exception as e:
         return f"Error executing tool '{tool_name}': {str(e)}"
\ No newline at end of file
@@ -0,0 +1,276 @@
+import bz2
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from xml.etree import ElementTree
+
+#index record: key offset, key length, block number, slot in block, section number, flags
+RECORD = struct.Struct("<QIIIHH")
+#block table record: offset and length of a compressed block in blocks.dat
+BLOCK = struct.Struct("<QI")
+WHOLE_ARTICLE = 0xFFFF
+FLAG_REDIRECT = 1
+SECTION_SEPARATOR = "#"
+
+INDEX_FILES = ("titles.idx", "titles.keys", "blocks.idx", "blocks.dat")
+
+_HEADING = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+_TABLE = re.compile(r"^\{\|.*?^\|\}", re.DOTALL | re.MULTILINE)
+_FILE_LINK = re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.IGNORECASE)
+_LINK = re.compile(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]")
+_EXTERNAL_LINK = re.compile(r"\[https?://[^\s\]]+\s*([^\]]*)\]")
+_EMPHASIS = re.compile(r"'{2,}")
+_REDIRECT = re.compile(r"^#REDIRECT\s*\[\[([^\]|#]+)", re.IGNORECASE)
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(title.replace("_", " ").casefold().split())
+
+
+def _strip_templates(text: str) -> str:
+    """Remove {{...}} templates, which may nest"""
+    out = []
+    depth = 0
+    i = 0
+    while i < len(text):
+        pair = text[i:i + 2]
+        if pair == "{{":
+            depth += 1
+            i += 2
+        elif pair == "}}" and depth:
+            depth -= 1
+            i += 2
+        else:
+            if not depth:
+                out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def clean_wikitext(text: str) -> str:
+    """Reduce wikitext to readable plain text"""
+    text = _COMMENT.sub("", text)
+    text = _REF.sub("", text)
+    text = _strip_templates(text)
+    text = _TABLE.sub("", text)
+    text = _FILE_LINK.sub("", text)
+    text = _LINK.sub(r"\1", text)
+    text = _EXTERNAL_LINK.sub(r"\1", text)
+    text = _TAG.sub("", text)
+    text = _EMPHASIS.sub("", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def split_sections(text: str) -> list[tuple[str, str]]:
+    """Split cleaned article text into (heading, body) pairs; the lead has an empty heading"""
+    sections = []
+    heading = ""
+    last = 0
+    for match in _HEADING.finditer(text):
+        sections.append((heading, text[last:match.start()].strip()))
+        heading = match.group(2).strip()
+        last = match.end()
+    sections.append((heading, text[last:].strip()))
+    return [(heading, body) for heading, body in sections if body or heading]
+
+
+def iter_dump(dump_path: str):
+    """Yield (title, wikitext) for main-namespace pages of a MediaWiki XML dump (.xml or .xml.bz2)"""
+    opener = bz2.open if str(dump_path).endswith(".bz2") else open
+    with opener(dump_path, "rb") as f:
+        title, namespace, text = None, "0", ""
+        for _, elem in ElementTree.iterparse(f, events=("end",)):
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = elem.text or ""
+            elif tag == "ns":
+                namespace = elem.text or "0"
+            elif tag == "text":
+                text = elem.text or ""
+            elif tag == "page":
+                if namespace == "0" and title:
+                    yield title, text
+                title, namespace, text = None, "0", ""
+                elem.clear()
+
+
+def build_index(dump_path: str, out_dir: str, articles_per_block: int = 64) -> int:
+    """Import a dump into a compressed, memory-mappable index and return the article count.
+
+    Articles are stored as zlib-compressed JSON blocks; titles, "title#section"
+    keys and redirects go into a sorted fixed-width index for binary search.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    entries = []
+    redirects = []
+    locations = {}
+    block_table = []
+    block = []
+
+    with open(out / "blocks.dat", "wb") as blocks:
+        def flush_block():
+            data = zlib.compress(json.dumps(block, ensure_ascii=False).encode("utf-8"), 6)
+            block_table.append((blocks.tell(), len(data)))
+            blocks.write(data)
+            block.clear()
+
+        for title, wikitext in iter_dump(dump_path):
+            redirect = _REDIRECT.match(wikitext)
+            if redirect:
+                redirects.append((normalize_title(title), normalize_title(redirect.group(1))))
+                continue
+
+            sections = split_sections(clean_wikitext(wikitext))
+            key = normalize_title(title)
+            location = (len(block_table), len(block))
+            locations[key] = location
+            entries.append((key, *location, WHOLE_ARTICLE, 0))
+            for number, (heading, _) in enumerate(sections):
+                if heading:
+                    entries.append((f"{key}{SECTION_SEPARATOR}{normalize_title(heading)}", *location, number, 0))
+
+            block.append({"title": title, "sections": sections})
+            if len(block) >= articles_per_block:
+                flush_block()
+        if block:
+            flush_block()
+
+    for source, target in redirects:
+        if target in locations and source not in locations:
+            entries.append((source, *locations[target], WHOLE_ARTICLE, FLAG_REDIRECT))
+
+    entries.sort(key=lambda entry: entry[0].encode("utf-8"))
+    with open(out / "titles.keys", "wb") as keys, open(out / "titles.idx", "wb") as index:
+        for key, block_number, slot, section, flags in entries:
+            encoded = key.encode("utf-8")
+            index.write(RECORD.pack(keys.tell(), len(encoded), block_number, slot, section, flags))
+            keys.write(encoded)
+    with open(out / "blocks.idx", "wb") as table:
+        for offset, length in block_table:
+            table.write(BLOCK.pack(offset, length))
+
+    return len(locations)
+
+
+class OfflineWikipedia:
+    """Serves Wikipedia lookups from an index built by build_index.
+
+    The title index and block table are memory-mapped and binary-searched,
+    so only the compressed block holding the article is read and inflated;
+    recently used blocks stay decompressed in an LRU cache.
+    """
+
+    def __init__(self, index_dir: str, max_chars: int = 1000):
+        self.index_dir = Path(index_dir)
+        self.max_chars = max_chars
+        self._files = [open(self.index_dir / name, "rb") for name in INDEX_FILES]
+        self._maps = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+                      for f in self._files]
+        self._index, self._keys, self._blocks, self._data = self._maps
+        self.count = len(self._index) // RECORD.size
+        self._load_block = lru_cache(maxsize=64)(self._read_block)
+
+    @classmethod
+    def from_env(cls):
+        """Open the index named by AGENTFLOW_WIKI_INDEX, or return None"""
+        index_dir = os.getenv("AGENTFLOW_WIKI_INDEX")
+        if not index_dir or not all((Path(index_dir) / name).exists() for name in INDEX_FILES):
+            return None
+        return cls(index_dir)
+
+    def close(self):
+        for m in self._maps:
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self._files:
+            f.close()
+
+    def _record(self, position: int) -> tuple:
+        return RECORD.unpack_from(self._index, position * RECORD.size)
+
+    def _key(self, record: tuple) -> bytes:
+        return self._keys[record[0]:record[0] + record[1]]
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(self._record(middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, key: str, prefix: bool = False) -> tuple | None:
+        encoded = key.encode("utf-8")
+        position = self._lower_bound(encoded)
+        if position < self.count:
+            record = self._record(position)
+            found = self._key(record)
+            if found == encoded:
+                return record
+            #closest title starting with the query, skipping section keys
+            separator = SECTION_SEPARATOR.encode("utf-8")
+            while prefix and position < self.count and found.startswith(encoded):
+                if separator not in found[len(encoded):]:
+                    return record
+                position += 1
+                if position < self.count:
+                    record = self._record(position)
+                    found = self._key(record)
+        return None
+
+    def _read_block(self, number: int) -> list:
+        offset, length = BLOCK.unpack_from(self._blocks, number * BLOCK.size)
+        return json.loads(zlib.decompress(self._data[offset:offset + length]))
+
+    def _article(self, record: tuple) -> dict:
+        return self._load_block(record[2])[record[3]]
+
+    def lookup(self, query: str, section: str | None = None) -> str | None:
+        """Lead section and section list of the best-matching article, or one section of it"""
+        key = normalize_title(query)
+        if section:
+            record = self._find(f"{key}{SECTION_SEPARATOR}{normalize_title(section)}")
+            if record is None:
+                article_record = self._find(key, prefix=True)
+                if article_record is None:
+                    return None
+                #redirects and prefix matches: retry with the article's own title
+                title = normalize_title(self._article(article_record)["title"])
+                record = self._find(f"{title}{SECTION_SEPARATOR}{normalize_title(section)}")
+            if record is not None:
+                article = self._article(record)
+                heading, body = article["sections"][record[4]]
+                return f"Page: {article['title']}\nSection: {heading}\n{body[:self.max_chars]}"
+
+        record = self._find(key, prefix=True)
+        if record is None:
+            return None
+        article = self._article(record)
+        sections = article["sections"]
+        lead = sections[0][1] if sections and not sections[0][0] else ""
+        headings = [heading for heading, _ in sections if heading]
+        result = f"Page: {article['title']}\nSummary: {lead[:self.max_chars]}"
+        if headings:
+            result += f"\nSections: {', '.join(headings)}"
+        return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python wiki_offline.py <dump.xml[.bz2]> <index_dir>")
+        sys.exit(1)
+    count = build_index(sys.argv[1], sys.argv[2])
+    print(f"Indexed {count} articles into {sys.argv[2]}")
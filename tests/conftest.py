@@ -0,0 +1,73 @@
+import http.server
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+#the app modules import each other as top-level modules from gui/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "gui"))
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    """Local HTTP server whose responses are set per path by the test"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        #path -> handler(request) that writes the response
+        self.routes = {}
+        #(path, headers) of every request received; handlers see POSTed JSON as request.body
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.body = None
+        self.dispatch()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.body = json.loads(self.rfile.read(length) or b"null")
+        self.dispatch()
+
+    def dispatch(self):
+        #route on the path without its query string
+        path = self.path.split("?")[0]
+        with self.server.lock:
+            self.server.requests.append((path, dict(self.headers)))
+        route = self.server.routes.get(path)
+        if route is None:
+            self.respond(404, b"not found")
+        else:
+            route(self)
+
+    def respond(self, status: int, body: bytes = b"", content_type: str = "text/plain", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
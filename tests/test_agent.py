@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+
+import pytest
+
+#the agent imports its tool backends
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+
+import agent
+from budget import RunBudget
+from routing import ModelRoute
+
+QUERY = "Why does the Moon always show the same face?"
+
+
+@pytest.fixture
+def api(stand_in, monkeypatch):
+    """Point the Anthropic client at the stand-in"""
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", stand_in.url(""))
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    return stand_in
+
+
+@pytest.fixture
+def stalled_api(api):
+    """Mock Messages API that sends `stream_head` (if streaming) and then stalls until released"""
+    stand_in = api
+    release = threading.Event()
+    stand_in.stream_head = []
+
+    def handle(request):
+        if request.body.get("stream"):
+            request.send_response(200)
+            request.send_header("Content-Type", "text/event-stream")
+            request.send_header("Connection", "close")
+            request.end_headers()
+            for name, data in stand_in.stream_head:
+                request.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+            request.wfile.flush()
+        release.wait(10)
+        request.close_connection = True
+
+    stand_in.routes["/v1/messages"] = handle
+    yield stand_in
+    release.set()
+
+
+def test_model_call_is_cut_off_at_the_deadline(stalled_api):
+    history = []
+    started = time.monotonic()
+
+    run = agent.agent_loop(QUERY, budget=RunBudget(deadline_s=0.5), history=history)
+
+    assert time.monotonic() - started < 3
+    assert run.stop_reason == "deadline"
+    assert run.response.topic == QUERY and run.response.summary == agent.DEADLINE_NOTE
+    #not retried: the deadline leaves no time for another attempt
+    assert len(stalled_api.requests) == 1
+    #the turn is closed so the session can continue
+    assert history[-1] == {"role": "assistant", "content": [{"type": "text", "text": agent.DEADLINE_NOTE}]}
+
+
+def test_deadline_keeps_the_streamed_answer(stalled_api):
+    message = {
+        "id": "msg_test", "type": "message", "role": "assistant", "model": "test", "content": [],
+        "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": 100, "output_tokens": 1}
+    }
+    partial = '{"topic": "Tidal locking", "summary": "The Moon rotates once per orbit", "sources": ["https://exa'
+    stalled_api.stream_head = [
+        ("message_start", {"type": "message_start", "message": message}),
+        ("content_block_start", {
+            "type": "content_block_start",
+            "index": 0,
+            "content_block": {"type": "tool_use", "id": "toolu_test", "name": agent.FINAL_ANSWER_TOOL, "input": {}}
+        }),
+        ("content_block_delta", {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "input_json_delta", "partial_json": partial}
+        })
+    ]
+    previews = []
+
+    run = agent.agent_loop(QUERY, max_iterations=1, partial_callback=previews.append, budget=RunBudget(deadline_s=0.5))
+
+    assert run.stop_reason == "deadline"
+    assert previews and previews[-1]["summary"] == "The Moon rotates once per orbit"
+    assert run.response.topic == "Tidal locking"
+    assert run.response.summary == "The Moon rotates once per orbit"
+    assert run.response.sources == []
+
+
+def test_failed_fast_call_is_redone_by_the_strong_model(api):
+    answer = {"topic": "Tidal locking", "summary": "Same face.", "sources": [], "tools_used": []}
+
+    def handle(request):
+        if request.body["model"] == "retired-fast":
+            error = {"type": "error", "error": {"type": "not_found_error", "message": "model: retired-fast"}}
+            request.respond(404, json.dumps(error).encode(), "application/json")
+            return
+        message = {
+            "id": "msg_test", "type": "message", "role": "assistant", "model": request.body["model"],
+            "content": [{"type": "tool_use", "id": "toolu_test", "name": agent.FINAL_ANSWER_TOOL, "input": answer}],
+            "stop_reason": "tool_use", "stop_sequence": None, "usage": {"input_tokens": 100, "output_tokens": 50}
+        }
+        request.respond(200, json.dumps(message).encode(), "application/json")
+
+    api.routes["/v1/messages"] = handle
+
+    run = agent.agent_loop(QUERY, route=ModelRoute(fast_model="retired-fast", strong_model="strong"))
+
+    assert run.response.topic == "Tidal locking"
+    assert [(decision.model, decision.reason) for decision in run.routing] == [
+        ("retired-fast", "tool_selection"), ("strong", "escalated_error")
+    ]
+    #not retried: a 404 won't go away
+    assert len(api.requests) == 2
@@ -0,0 +1,146 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fetch import PageFetcher
+
+ARTICLE = (
+    b"<html><head><title>Tidal locking</title></head><body>"
+    b"<nav>Home | About</nav><article><p>" + b"The Moon always shows the same face to Earth. " * 10 +
+    b"</p></article><footer>Copyright</footer></body></html>"
+)
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    fetcher = PageFetcher(tmp_path / "cache", fresh_s=0, allow_private=True)
+    yield fetcher
+    fetcher.client.close()
+
+
+def test_extracts_main_content(stand_in, fetcher):
+    stand_in.routes["/article"] = lambda r: r.respond(200, ARTICLE, "text/html; charset=utf-8")
+
+    text = fetcher.fetch(stand_in.url("/article"))
+
+    assert text.startswith("Tidal locking\n\nThe Moon always shows the same face")
+    assert "Home | About" not in text and "Copyright" not in text
+
+
+def test_revalidates_with_etag(stand_in, fetcher):
+    def page(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            request.respond(304, headers={"ETag": '"v1"'})
+        else:
+            request.respond(200, b"original text", headers={"ETag": '"v1"'})
+    stand_in.routes["/page"] = page
+
+    first = fetcher.fetch(stand_in.url("/page"))
+    second = fetcher.fetch(stand_in.url("/page"))
+
+    assert first == second == "original text"
+    assert stand_in.requests[0][1].get("If-None-Match") is None
+    assert stand_in.requests[1][1].get("If-None-Match") == '"v1"'
+
+
+def test_fresh_cache_skips_request(stand_in, tmp_path):
+    stand_in.routes["/page"] = lambda r: r.respond(200, b"cached text")
+    fetcher = PageFetcher(tmp_path / "cache", fresh_s=3600, allow_private=True)
+
+    fetcher.fetch(stand_in.url("/page"))
+    assert fetcher.fetch(stand_in.url("/page")) == "cached text"
+    assert len(stand_in.requests) == 1
+
+
+def test_stops_reading_at_max_bytes(stand_in, tmp_path):
+    stand_in.routes["/big"] = lambda r: r.respond(200, "é".encode("utf-8") * 50_000)
+    fetcher = PageFetcher(tmp_path / "cache", max_bytes=1001, allow_private=True)
+
+    text = fetcher.fetch(stand_in.url("/big"))
+
+    #1001 bytes hold 500 two-byte characters; the split one is dropped, not replaced
+    assert text == "é" * 500
+
+
+def test_rejects_unsupported_content_type(stand_in, fetcher):
+    stand_in.routes["/image"] = lambda r: r.respond(200, b"\x89PNG", "image/png")
+
+    with pytest.raises(ValueError, match="Unsupported content type image/png"):
+        fetcher.fetch(stand_in.url("/image"))
+
+
+def test_fetch_many_runs_concurrently(stand_in, fetcher):
+    def slow(request):
+        time.sleep(0.3)
+        request.respond(200, f"page {request.path}".encode())
+    urls = [stand_in.url(f"/slow{i}") for i in range(4)]
+    for i in range(4):
+        stand_in.routes[f"/slow{i}"] = slow
+
+    start = time.perf_counter()
+    text = fetcher.fetch_many(urls)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.9
+    for i, url in enumerate(urls):
+        assert f"Source: {url}\npage /slow{i}" in text
+
+
+def test_fetch_many_reports_errors_per_url(stand_in, fetcher):
+    stand_in.routes["/ok"] = lambda r: r.respond(200, b"fine")
+
+    text = fetcher.fetch_many([stand_in.url("/ok"), stand_in.url("/missing")])
+
+    assert f"Source: {stand_in.url('/ok')}\nfine" in text
+    assert f"Source: {stand_in.url('/missing')}\nError fetching page" in text
+
+
+def test_concurrent_fetches_of_one_url(stand_in, fetcher):
+    stand_in.routes["/shared"] = lambda r: r.respond(200, b"shared source")
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        texts = list(pool.map(lambda _: fetcher.fetch(stand_in.url("/shared")), range(20)))
+
+    assert texts == ["shared source"] * 20
+    assert not list(fetcher.cache_dir.glob("*.tmp"))
+
+
+def test_refuses_private_addresses(stand_in, tmp_path):
+    stand_in.routes["/page"] = lambda r: r.respond(200, b"internal")
+    fetcher = PageFetcher(tmp_path / "cache")
+
+    for url in (stand_in.url("/page"), "http://localhost/", "http://169.254.169.254/latest/meta-data/"):
+        with pytest.raises(ValueError, match="non-public address"):
+            fetcher.fetch(url)
+    assert not stand_in.requests
+
+
+def test_checks_every_redirect_hop(stand_in, tmp_path):
+    class Guarded(PageFetcher):
+        """Treats /internal as a private host so the redirect check can run locally"""
+        def _check_url(self, url):
+            if "/internal" in url:
+                raise ValueError(f"Refusing to fetch {url}: non-public address")
+
+    stand_in.routes["/redirect"] = lambda r: r.respond(302, headers={"Location": "/internal"})
+    stand_in.routes["/internal"] = lambda r: r.respond(200, b"secret")
+    fetcher = Guarded(tmp_path / "cache")
+
+    with pytest.raises(ValueError, match="non-public address"):
+        fetcher.fetch(stand_in.url("/redirect"))
+    assert [path for path, _ in stand_in.requests] == ["/redirect"]
+
+
+def test_checks_the_address_actually_connected_to(stand_in, tmp_path):
+    class Rebound(PageFetcher):
+        """Resolves as public when checked, then connects to the loopback stand-in (DNS rebinding)"""
+        def _check_url(self, url):
+            pass
+
+    stand_in.routes["/page"] = lambda r: r.respond(200, b"internal")
+    fetcher = Rebound(tmp_path / "cache")
+
+    with pytest.raises(ValueError, match="non-public address 127.0.0.1"):
+        fetcher.fetch(stand_in.url("/page"))
+    assert not list(fetcher.cache_dir.glob("*.json"))
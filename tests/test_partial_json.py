@@ -0,0 +1,120 @@
+import copy
+import json
+import random
+
+import pytest
+
+from partial_json import PartialJSONParser
+
+DOCUMENT = {
+    "topic": "Tidal locking 🌕",
+    "summary": 'The Moon\'s "far side"\nnever faces Earth \\ it rotates once per orbit (27.3 days) — café 𝔐.',
+    "sources": ["https://example.org/a?q=1&b=\"2\"", ["nested", 1, {"x": "]"}], "emoji 🌕", 3.5, None],
+    "confidence": 0.9,
+    "verified": True,
+    "notes": None,
+    "meta": {"tools": ["search", "wikipedia"], "closing": "}"},
+    "tools_used": []
+}
+
+
+def feed_in_chunks(text: str, sizes) -> list[dict]:
+    parser = PartialJSONParser()
+    snapshots = []
+    position = 0
+    for size in sizes:
+        if position >= len(text):
+            break
+        snapshots.append(copy.deepcopy(parser.feed(text[position:position + size])))
+        position += size
+    assert position >= len(text)
+    assert parser.done
+    return snapshots
+
+
+def assert_consistent(snapshot: dict, final: dict):
+    """Every field seen so far is the final value, or a prefix of it while it streams"""
+    assert list(snapshot) == list(final)[:len(snapshot)]
+    for key, value in snapshot.items():
+        expected = final[key]
+        if isinstance(value, str):
+            assert expected.startswith(value)
+        elif isinstance(value, list) and isinstance(expected, list):
+            assert len(value) <= len(expected)
+            for index, (item, expected_item) in enumerate(zip(value, expected)):
+                #only the last item can still be streaming
+                if isinstance(item, str) and index == len(value) - 1:
+                    assert expected_item.startswith(item)
+                else:
+                    assert item == expected_item
+        else:
+            assert value == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_random_chunk_sizes(seed, ensure_ascii):
+    text = json.dumps(DOCUMENT, ensure_ascii=ensure_ascii, indent=None if seed % 2 else 2)
+    rng = random.Random(seed)
+
+    snapshots = feed_in_chunks(text, iter(lambda: rng.randint(1, 9), None))
+
+    for snapshot in snapshots:
+        assert_consistent(snapshot, DOCUMENT)
+    assert snapshots[-1] == DOCUMENT
+    #string fields grow monotonically as they stream
+    summaries = [snapshot.get("summary", "") for snapshot in snapshots]
+    assert all(len(a) <= len(b) for a, b in zip(summaries, summaries[1:]))
+
+
+def test_one_character_at_a_time():
+    text = json.dumps(DOCUMENT)
+    snapshots = feed_in_chunks(text, [1] * len(text))
+
+    for snapshot in snapshots:
+        assert_consistent(snapshot, DOCUMENT)
+    assert snapshots[-1] == DOCUMENT
+
+
+def test_escape_split_across_chunks():
+    parser = PartialJSONParser()
+
+    assert parser.feed('{"summary": "a\\') == {"summary": "a"}
+    assert parser.feed('nb\\u00') == {"summary": "a\nb"}
+    assert parser.feed('e9\\') == {"summary": "a\nbé"}
+    assert parser.feed('"c"}') == {"summary": 'a\nbé"c'}
+    assert parser.done
+
+
+def test_surrogate_pair_waits_for_its_low_half():
+    parser = PartialJSONParser()
+
+    assert parser.feed('{"topic": "moon \\ud83c') == {"topic": "moon "}
+    assert parser.feed('\\udf1') == {"topic": "moon "}
+    assert parser.feed('5 phases"}') == {"topic": "moon 🌕 phases"}
+
+
+def test_raw_values_are_reported_once_complete():
+    parser = PartialJSONParser()
+
+    assert parser.feed('{"confidence": 0.') == {}
+    assert parser.feed('75, "verified": tr') == {"confidence": 0.75}
+    assert parser.feed('ue, "meta": {"a": [1, "}"') == {"confidence": 0.75, "verified": True}
+    assert parser.feed(']}, "notes": null}') == {
+        "confidence": 0.75, "verified": True, "meta": {"a": [1, "}"]}, "notes": None
+    }
+
+
+def test_nested_arrays():
+    parser = PartialJSONParser()
+
+    assert parser.feed('{"sources": ["a", ["b", [2') == {"sources": ["a"]}
+    assert parser.feed(']], "c') == {"sources": ["a", ["b", [2]], "c"]}
+    assert parser.feed('d", []]}') == {"sources": ["a", ["b", [2]], "cd", []]}
+
+
+def test_rejects_non_objects():
+    with pytest.raises(ValueError):
+        PartialJSONParser().feed('["not", "an", "object"]')
+    with pytest.raises(ValueError):
+        PartialJSONParser().feed('{"topic" "missing colon"}')
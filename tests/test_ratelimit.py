@@ -0,0 +1,166 @@
+import threading
+import time
+
+import anthropic
+import httpx
+import pytest
+
+import ratelimit
+from ratelimit import IMAGE_TOKENS, CancelToken, RateLimiter, ToolCallCancelled, estimate_input_tokens
+
+
+class FakeClock:
+    """Stands in for the time module in ratelimit: sleeps are recorded and advance the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def api_error(error_class, status: int, headers: dict = None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+    return error_class("error", response=response, body=None)
+
+
+def test_update_from_headers_resyncs_the_buckets():
+    limiter = RateLimiter(requests_per_minute=50, tokens_per_minute=30000)
+
+    assert limiter.update_from_headers({
+        "anthropic-ratelimit-requests-limit": "120",
+        "anthropic-ratelimit-requests-remaining": "7",
+        "anthropic-ratelimit-input-tokens-limit": "90000",
+        "anthropic-ratelimit-input-tokens-remaining": "1500",
+        "anthropic-ratelimit-tokens-limit": "1000000",
+        "anthropic-ratelimit-tokens-remaining": "999999"
+    })
+
+    assert (limiter.requests.capacity, limiter.requests.refill_per_s) == (120, 2)
+    assert limiter.requests.tokens == 7
+    #input-token limits win over the combined token limits
+    assert (limiter.tokens.capacity, limiter.tokens.refill_per_s) == (90000, 1500)
+    assert limiter.tokens.tokens == 1500
+
+
+def test_update_from_headers_without_token_limits():
+    limiter = RateLimiter(requests_per_minute=50, tokens_per_minute=30000)
+
+    assert not limiter.update_from_headers({})
+    assert not limiter.update_from_headers({
+        "anthropic-ratelimit-input-tokens-limit": "lots",
+        "anthropic-ratelimit-input-tokens-remaining": "some"
+    })
+    assert limiter.tokens.capacity == 30000
+
+
+def test_retry_after_pauses_the_shared_bucket(clock, monkeypatch):
+    limiter = RateLimiter(requests_per_minute=600)
+    paused = []
+    monkeypatch.setattr(limiter.requests, "pause", paused.append)
+    calls = []
+
+    def call():
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise api_error(anthropic.RateLimitError, 429, {"retry-after": "3"})
+        return "response", {}
+
+    assert limiter.call_model(call, {"messages": []}) == "response"
+    #every session drawing from the requests bucket is held back, not just this one
+    assert paused == [3.0]
+    #and the retry waits at least as long as the server asked
+    assert len(clock.sleeps) == 1 and calls[1] - calls[0] >= 3
+
+
+def test_paused_bucket_holds_back_every_caller(clock):
+    bucket = ratelimit.TokenBucket(capacity=10, refill_per_s=10)
+    bucket.pause(4)
+
+    assert bucket.acquire()
+
+    assert bucket.tokens == 9
+    assert sum(clock.sleeps) >= 4
+
+
+def test_backoff_stops_at_max_attempts(clock):
+    limiter = RateLimiter(max_attempts=4)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise api_error(anthropic.InternalServerError, 529)
+
+    with pytest.raises(anthropic.InternalServerError):
+        limiter.call_model(call, {"messages": []})
+
+    assert len(calls) == 4
+    #full jitter: anywhere between 0 and the exponential cap, no sleep after the last attempt
+    assert len(clock.sleeps) == 3
+    assert all(0 <= delay <= 2 ** attempt for attempt, delay in enumerate(clock.sleeps))
+
+
+def test_non_retryable_errors_are_raised_at_once(clock):
+    limiter = RateLimiter()
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise api_error(anthropic.BadRequestError, 400)
+
+    with pytest.raises(anthropic.BadRequestError):
+        limiter.call_model(call, {"messages": []})
+    assert len(calls) == 1 and not clock.sleeps
+
+
+def test_tool_call_cancelled_while_waiting_on_its_bucket():
+    limiter = RateLimiter(tool_rates={"search": (1, 0.01)})
+    assert limiter.call_tool("search", lambda: "first") == "first"
+
+    cancel = CancelToken()
+    timer = threading.Timer(0.2, cancel.cancel)
+    timer.start()
+    started = time.monotonic()
+    with pytest.raises(ToolCallCancelled):
+        limiter.call_tool("search", lambda: pytest.fail("cancelled call reached its backend"), cancel)
+    timer.join()
+
+    #woken by the cancel rather than waiting ~100 s for a token
+    assert time.monotonic() - started < 5
+
+
+def test_cancel_after_start_has_no_effect():
+    cancel = CancelToken()
+
+    assert cancel.start()
+    assert not cancel.cancel()
+    assert not cancel.cancelled
+
+
+def test_estimate_ignores_base64_image_data():
+    def request(data: str) -> dict:
+        return {
+            "system": "You are a research assistant.",
+            "messages": [{"role": "user", "content": [
+                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": data}},
+                {"type": "text", "text": "What is in this screenshot?" * 40}
+            ]}]
+        }
+
+    small = estimate_input_tokens(request(""))
+    large = estimate_input_tokens(request("A" * 4_000_000))
+
+    assert large == small
+    assert IMAGE_TOKENS < small < IMAGE_TOKENS + 400
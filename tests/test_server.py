@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+
+import pytest
+
+#the service imports the agent and its tool backends
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+
+from starlette.testclient import TestClient
+
+import server
+import tools
+from store import ResultStore
+
+ANSWER = {
+    "topic": "Tidal locking",
+    "summary": "The Moon rotates once per orbit, so the same hemisphere always faces Earth.",
+    "sources": ["https://example.org/tidal-locking", "https://example.org/moon"],
+    "tools_used": ["search"]
+}
+
+
+def message(model: str) -> dict:
+    return {
+        "id": "msg_test",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "tool_use", "id": "toolu_test", "name": "submit_research", "input": ANSWER}],
+        "stop_reason": "tool_use",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 100, "output_tokens": 50}
+    }
+
+
+def message_stream(model: str) -> bytes:
+    """The same answer as Messages API server-sent events, its input split into small chunks"""
+    start = {**message(model), "content": [], "stop_reason": None, "usage": {"input_tokens": 100, "output_tokens": 1}}
+    answer = json.dumps(ANSWER)
+    events = [
+        ("message_start", {"type": "message_start", "message": start}),
+        ("content_block_start", {
+            "type": "content_block_start",
+            "index": 0,
+            "content_block": {"type": "tool_use", "id": "toolu_test", "name": "submit_research", "input": {}}
+        })
+    ]
+    for i in range(0, len(answer), 12):
+        events.append(("content_block_delta", {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "input_json_delta", "partial_json": answer[i:i + 12]}
+        }))
+    events += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "tool_use", "stop_sequence": None},
+            "usage": {"output_tokens": 50}
+        }),
+        ("message_stop", {"type": "message_stop"})
+    ]
+    return "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events).encode()
+
+
+@pytest.fixture
+def messages_api(stand_in, monkeypatch):
+    """Mock Messages API on the stand-in; calls block until `release` is set"""
+    release = threading.Event()
+    release.set()
+
+    def handle(request):
+        release.wait(10)
+        if request.body.get("stream"):
+            request.respond(200, message_stream(request.body["model"]), "text/event-stream")
+        else:
+            request.respond(200, json.dumps(message(request.body["model"])).encode(), "application/json")
+
+    stand_in.routes["/v1/messages"] = handle
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", stand_in.url(""))
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    #prefetched lookups must not reach the real search backends
+    monkeypatch.setattr(tools, "run_tool", lambda name, tool_input, cancel=None: f"{name} result")
+    return release
+
+
+@pytest.fixture
+def make_client(messages_api, tmp_path, monkeypatch):
+    store = ResultStore(tmp_path / "store")
+    monkeypatch.setattr(server, "get_store", lambda: store)
+    clients = []
+
+    def make(**service_options):
+        client = TestClient(server.create_app(server.ResearchService(**service_options)))
+        clients.append(client.__enter__())
+        return client
+
+    yield make
+    messages_api.set()
+    for client in clients:
+        client.__exit__(None, None, None)
+    store.close()
+
+
+def parse_events(body: str) -> list[dict]:
+    events = []
+    for chunk in body.strip().split("\n\n"):
+        data = [line[len("data: "):] for line in chunk.splitlines() if line.startswith("data: ")]
+        if data:
+            events.append(json.loads(data[0]))
+    return events
+
+
+def wait_for_status(client, job_id: str, status: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get(f"/research/{job_id}").json()["status"] == status:
+            return
+        time.sleep(0.02)
+    raise AssertionError(f"research {job_id} never reached {status}")
+
+
+def test_streams_research_as_server_sent_events(make_client):
+    client = make_client()
+
+    submitted = client.post("/research", json={"query": "Why does the Moon always show the same face?"})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+
+    with client.stream("GET", submitted.json()["events"]) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_events(response.read().decode())
+
+    types = [event["type"] for event in events]
+    assert types[:2] == ["status", "status"] and types[-1] == "result"
+    assert "progress" in types
+
+    tokens = [event for event in events if event["type"] == "token"]
+    assert "".join(event["summary_delta"] for event in tokens) == ANSWER["summary"]
+    #the topic streams in too, and is only resent when it grows
+    topics = [event["topic"] for event in tokens if event["topic"]]
+    assert topics[-1] == ANSWER["topic"]
+    assert all(ANSWER["topic"].startswith(topic) for topic in topics) and len(set(topics)) == len(topics)
+    #no-op events (e.g. while sources stream) are not sent
+    assert all(event["summary_delta"] or event["topic"] for event in tokens)
+    assert not any(event["reset"] for event in tokens)
+
+    assert events[-1]["result"]["response"] == ANSWER
+    assert client.get(f"/research/{job_id}").json()["status"] == "done"
+
+
+def test_rejects_client_over_its_limit(make_client, messages_api):
+    client = make_client(workers=2, max_per_client=1)
+    messages_api.clear()
+
+    first = client.post("/research", json={"query": "first"}, headers={"x-client-id": "a"})
+    busy = client.post("/research", json={"query": "second"}, headers={"x-client-id": "a"})
+    other = client.post("/research", json={"query": "third"}, headers={"x-client-id": "b"})
+
+    assert first.status_code == 202
+    assert busy.status_code == 429
+    assert busy.headers["retry-after"] == "5"
+    assert "in progress" in busy.json()["error"]
+    assert other.status_code == 202
+
+    messages_api.set()
+    wait_for_status(client, first.json()["id"], "done")
+    assert client.post("/research", json={"query": "again"}, headers={"x-client-id": "a"}).status_code == 202
+
+
+def test_rejects_when_queue_is_full(make_client, messages_api):
+    client = make_client(workers=1, queue_size=1, max_per_client=5)
+    messages_api.clear()
+
+    running = client.post("/research", json={"query": "running"})
+    wait_for_status(client, running.json()["id"], "running")
+    queued = client.post("/research", json={"query": "queued"})
+    rejected = client.post("/research", json={"query": "rejected"})
+
+    assert queued.status_code == 202
+    assert rejected.status_code == 429
+    assert rejected.json()["error"] == "Research queue is full"
+    assert client.get("/health").json()["queued"] == 1
+
+
+def test_rejects_invalid_requests(make_client):
+    client = make_client()
+
+    assert client.post("/research", json={"query": "  "}).status_code == 400
+    assert client.post("/research", content=b"not json").status_code == 400
+    assert client.post("/research", json={"query": "q", "image": "%%%"}).status_code == 400
+    assert client.get("/research/unknown").status_code == 404
+
+
+def test_token_events_reset_when_the_answer_restarts():
+    job = server.Job("client", "query", None)
+
+    assert job.partial_event({"topic": "Tides"}) == {"type": "token", "topic": "Tides", "summary_delta": "", "reset": False}
+    assert job.partial_event({"topic": "Tides", "summary": "first"})["summary_delta"] == "first"
+    assert job.partial_event({"topic": "Tides", "summary": "first try"})["summary_delta"] == " try"
+    assert job.partial_event({"topic": "Tides", "summary": "first try", "sources": []}) is None
+
+    #a retried answer starts over with a shorter, and then a different, summary
+    assert job.partial_event({"topic": "Tides"}) == {"type": "token", "topic": None, "summary_delta": "", "reset": True}
+    assert job.partial_event({"topic": "Tides", "summary": "second"})["summary_delta"] == "second"
+    restarted = job.partial_event({"topic": "Tides", "summary": "other"})
+    assert restarted["reset"] and restarted["summary_delta"] == "other"
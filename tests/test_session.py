@@ -0,0 +1,60 @@
+import pytest
+
+#sessions run the agent and its tool backends
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+
+from agent import FINAL_ANSWER_PROMPT, ResearchResponse
+from session import KEEP_TURNS, MAX_HISTORY_TURNS, RECAP_HEADER, ResearchSession
+
+SCREENSHOT = {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "iVBORw0KGgo="}}
+
+
+def turn(number: int, screenshot: bool = False) -> list[dict]:
+    """Messages of one finished question: a search round, then the submitted answer"""
+    opening = [] if number == 0 else [{"type": "tool_result", "tool_use_id": f"answer{number - 1}", "content": "Answer submitted."}]
+    if screenshot:
+        opening.append(SCREENSHOT)
+    opening.append({"type": "text", "text": f"question {number}"})
+    return [
+        {"role": "user", "content": opening},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": f"search{number}", "name": "search", "input": {"query": "q"}}]},
+        {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": f"search{number}", "content": "result"},
+            {"type": "text", "text": FINAL_ANSWER_PROMPT}
+        ]},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": f"answer{number}", "name": "submit_research", "input": {}}]}
+    ]
+
+
+def session_with(turns: int, screenshot_turns=()) -> ResearchSession:
+    session = ResearchSession()
+    for number in range(turns):
+        session.messages += turn(number, number in screenshot_turns)
+        session.responses.append(ResearchResponse(topic=f"topic {number}", summary=f"summary {number}", sources=[], tools_used=[]))
+    return session
+
+
+def test_short_history_is_sent_unchanged():
+    session = session_with(2, screenshot_turns={0})
+
+    history = session.compacted_history()
+
+    assert history == session.messages
+    assert history[0]["content"][0] == SCREENSHOT
+
+
+def test_long_history_is_folded_into_a_recap():
+    session = session_with(MAX_HISTORY_TURNS + 1, screenshot_turns={0, MAX_HISTORY_TURNS})
+
+    history = session.compacted_history()
+
+    assert len(history) == KEEP_TURNS * 4
+    recap, *opening = history[0]["content"]
+    assert recap["text"].startswith(RECAP_HEADER)
+    assert "topic 0: summary 0" in recap["text"]
+    #the first kept turn no longer answers a dropped tool call
+    assert all(block["type"] != "tool_result" for block in opening)
+    #screenshots of kept turns stay attached, folded ones are gone
+    images = [block for message in history for block in message["content"] if block.get("type") == "image"]
+    assert images == [SCREENSHOT]
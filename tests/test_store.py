@@ -0,0 +1,124 @@
+import sqlite3
+
+import pytest
+
+from store import ACTIVE_SEGMENT, ResultStore
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    stores = []
+
+    def make(**options):
+        store = ResultStore(tmp_path / "store", flush_interval=0.01, **options)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def result(number: int, summary: str = "") -> dict:
+    return {
+        "topic": f"Topic {number}",
+        "summary": summary or f"Summary number {number}",
+        "sources": [f"https://example.org/{number}"],
+        "tools_used": ["search"]
+    }
+
+
+def fill(store: ResultStore, count: int, summary_size: int = 0) -> list[str]:
+    """Write `count` results one batch at a time, oldest first"""
+    ids = []
+    for number in range(count):
+        ids.append(store.put(result(number, f"result {number} " + "x" * summary_size if summary_size else "")))
+        store.flush()
+    return ids
+
+
+def test_rotates_and_reads_across_segments(make_store):
+    store = make_store(max_bytes=64 * 1024)
+
+    ids = fill(store, 40, summary_size=8000)
+
+    rotated = sorted(store.directory.glob("results-*.db"))
+    assert len(rotated) >= 2
+    assert store.count() == 40
+    #the oldest record lives in the first rotated segment
+    oldest = sqlite3.connect(rotated[0])
+    try:
+        assert oldest.execute("SELECT record_id FROM results WHERE topic = 'Topic 0'").fetchone() == (ids[0],)
+    finally:
+        oldest.close()
+    assert store.get(ids[0])["topic"] == "Topic 0"
+    assert [record["id"] for record in store.recent(limit=40)] == ids[::-1]
+    assert [record["topic"] for record in store.by_topic("topic 1")] == ["Topic 1"]
+    assert {record["id"] for record in store.search("result")} <= set(ids)
+    assert len(store.search("result", limit=40)) == 40
+
+
+def test_large_wal_alone_does_not_rotate(make_store):
+    store = make_store(max_bytes=512 * 1024)
+    active = store.directory / ACTIVE_SEGMENT
+    #rewrite one small row many times: the WAL grows while the database stays small
+    other = sqlite3.connect(active)
+    other.execute("PRAGMA wal_autocheckpoint=0")
+    other.execute("CREATE TABLE scratch (value TEXT)")
+    other.execute("INSERT INTO scratch VALUES ('')")
+    other.commit()
+    for number in range(300):
+        other.execute("UPDATE scratch SET value = ?", (str(number) * 500,))
+        other.commit()
+    other.close()
+    assert active.with_name(active.name + "-wal").stat().st_size > store.max_bytes
+
+    fill(store, 1)
+
+    assert not list(store.directory.glob("results-*.db"))
+    assert active.with_name(active.name + "-wal").stat().st_size < store.max_bytes
+    assert store.count() == 1
+
+
+def test_recent_pages_with_offset(make_store):
+    store = make_store()
+    ids = fill(store, 12)
+    newest_first = ids[::-1]
+
+    pages = [store.recent(limit=5, offset=offset) for offset in (0, 5, 10)]
+
+    assert [[record["id"] for record in page] for page in pages] == [
+        newest_first[0:5], newest_first[5:10], newest_first[10:12]
+    ]
+    assert store.recent(limit=5, offset=12) == []
+
+
+def test_full_text_search(make_store):
+    store = make_store()
+    store.put({"topic": "Tidal locking", "summary": "The Moon always shows Earth the same face.", "sources": []})
+    store.put({"topic": "Solar wind", "summary": "Charged particles stream from the Sun.", "sources": []})
+    store.put({"topic": "Moon phases", "summary": "Phases follow the Moon's orbit; tidal effects are minor.", "sources": []})
+
+    assert [record["topic"] for record in store.search("moon face")] == ["Tidal locking"]
+    assert {record["topic"] for record in store.search("tidal")} == {"Tidal locking", "Moon phases"}
+    assert store.search("eclipse") == []
+    #FTS5 operators and quotes in user text are searched for literally
+    assert store.search('moon AND "face') == []
+    assert store.search("   ") == []
+
+
+def test_flush_reports_failed_writes_once(make_store):
+    store = make_store()
+    fill(store, 1)
+    #break the schema under the writer so the next insert fails
+    other = sqlite3.connect(store.directory / ACTIVE_SEGMENT)
+    other.execute("DROP TABLE results")
+    other.commit()
+    other.close()
+
+    store.put(result(1))
+    store.put(result(2))
+    with pytest.raises(RuntimeError, match=r"Could not write 2 result\(s\)"):
+        store.flush()
+    #the error is reported once
+    store.flush()
@@ -0,0 +1,90 @@
+import bz2
+import shutil
+from pathlib import Path
+
+import pytest
+
+from wiki_offline import OfflineWikipedia, build_index
+
+DUMP = Path(__file__).parent / "fixtures" / "wiki_dump.xml"
+
+
+@pytest.fixture
+def wiki(tmp_path):
+    #one article per block so lookups have to pick the right block
+    assert build_index(DUMP, tmp_path / "index", articles_per_block=1) == 3
+    wiki = OfflineWikipedia(tmp_path / "index")
+    yield wiki
+    wiki.close()
+
+
+def test_exact_title(wiki):
+    result = wiki.lookup("tidal_locking")
+
+    assert result.startswith("Page: Tidal locking\nSummary: Tidal locking is when an orbiting body")
+    assert "as the Moon does with Earth." in result
+    assert "Gladman" not in result and "Short description" not in result and "Category" not in result
+    assert result.endswith("Sections: Mechanism, Examples")
+
+
+def test_redirect(wiki):
+    assert wiki.lookup("Tidally locked").startswith("Page: Tidal locking\n")
+
+
+def test_section(wiki):
+    assert wiki.lookup("Moon", "orbit") == "Page: Moon\nSection: Orbit\nThe Moon is tidally locked to Earth."
+
+
+def test_section_through_redirect(wiki):
+    result = wiki.lookup("Tidally locked", "Examples")
+
+    assert result == "Page: Tidal locking\nSection: Examples\nPluto and Charon are locked to each other."
+
+
+def test_unknown_section_falls_back_to_article(wiki):
+    assert wiki.lookup("Moon", "History").startswith("Page: Moon\nSummary: The Moon is Earth's only natural satellite.")
+
+
+def test_prefix_match(wiki):
+    assert wiki.lookup("Tidal lo").startswith("Page: Tidal locking\n")
+    assert wiki.lookup("tidal").startswith("Page: Tidal force\n")
+
+
+def test_miss(wiki):
+    assert wiki.lookup("Sun") is None
+    assert wiki.lookup("Talk:Moon") is None
+
+
+def test_bz2_dump(tmp_path):
+    compressed = tmp_path / "dump.xml.bz2"
+    with open(DUMP, "rb") as source, bz2.open(compressed, "wb") as target:
+        shutil.copyfileobj(source, target)
+
+    assert build_index(compressed, tmp_path / "index") == 3
+    wiki = OfflineWikipedia(tmp_path / "index")
+    try:
+        assert wiki.lookup("Tidally locked", "Mechanism").startswith("Page: Tidal locking\nSection: Mechanism\n")
+    finally:
+        wiki.close()
+
+
+def test_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENTFLOW_WIKI_INDEX", str(tmp_path / "index"))
+    assert OfflineWikipedia.from_env() is None
+
+    build_index(DUMP, tmp_path / "index")
+    wiki = OfflineWikipedia.from_env()
+    try:
+        assert wiki.lookup("Moon").startswith("Page: Moon\n")
+    finally:
+        wiki.close()
+
+
+def test_miss_without_live_fallback(wiki, monkeypatch):
+    tools = pytest.importorskip("tools")
+    monkeypatch.setattr(tools, "wiki_offline", wiki)
+    monkeypatch.setattr(tools, "WIKI_LIVE_FALLBACK", False)
+    monkeypatch.setattr(tools.wiki_tool, "run", lambda query: pytest.fail("live Wikipedia was called"))
+
+    assert tools.wikipedia_lookup("Sun") == "No offline Wikipedia article found for 'Sun'"
+    assert tools.wikipedia_lookup("Tidally locked").startswith("Page: Tidal locking\n")